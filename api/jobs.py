@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import tempfile
+import traceback
+from uuid import uuid4
+from typing import Optional
+from contextlib import nullcontext
+from flask import request, send_file
+from gevent.pool import Pool
+from gevent.threadpool import ThreadPoolExecutor
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_options_header
+from .process import RPC
+from .offload import Offload
+from .utils.cache import DiskCache
+
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+# seconds to keep results of finished jobs for
+JOBS_RETENTION = float(os.environ.get('JOBS_RETENTION', 24 * 3600))
+JOBS_MAX_BYTES = int(os.environ.get('JOBS_MAX_BYTES', 1 << 30))
+
+
+class Job:
+    def __init__(self, id: str, function: str, **state):
+        self.id = id
+        self.function = function
+        self.status = 'queued'
+        self.stage = None
+        self.done = None
+        self.total = None
+        self.error = None
+        self.filename = None
+        self.mimetype = None
+        self.submitted = time.time()
+        self.finished = None
+        vars(self).update(state)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class JobQueue:
+    """
+    Run RPC functions in the background: submit returns a Job at once,
+    while `offload` runs it and keeps its result on disk
+    for `retention` seconds.
+
+    Uploaded files are saved before submit returns, for the job to run
+    the RPC function in a request context of them and the submitted form.
+    Jobs wait on offload's workers in greenlets, or run in a bounded pool
+    of native threads if offload has none, and report their progress
+    with progress.report.
+
+    Parameters
+    ----------
+    offload    : Offload running the RPC calls.
+    directory  : created if missing, to keep uploads, results and job states.
+    workers    : number of jobs to run at once, others are queued.
+    retention  : seconds to keep results of finished jobs for.
+    max_bytes  : total size of results to keep.
+
+    """
+
+    def __init__(self, offload: Offload, directory: str,
+                 workers: int = JOBS_WORKERS,
+                 retention: float = JOBS_RETENTION,
+                 max_bytes: int = JOBS_MAX_BYTES):
+        self.offload = offload
+        self.directory = directory
+        self.retention = retention
+        self.results = DiskCache(directory, max_bytes, '.result', retention)
+        self.states = DiskCache(directory, max_bytes, '.json', retention)
+        # greenlets waiting on workers, or else native threads
+        # unlike monkey patched threading
+        self.spawn = Pool(workers).spawn if offload.workers \
+            else ThreadPoolExecutor(workers).submit
+        self.jobs = {}
+
+    def submit(self):
+        """
+        Job of the RPC function named by form field `function`
+        of the current request.
+
+        """
+        function = request.form.get('function')
+        if function not in RPC:
+            raise ValueError(f'Unknown function {function}')
+
+        job = Job(uuid4().hex, function)
+        uploads = {}
+        for name, file in request.files.items(multi=False):
+            if file:
+                fd, path = tempfile.mkstemp(dir=self.directory,
+                                            suffix='.upload')
+                os.close(fd)
+                file.save(path)
+                uploads[name] = (path, file.filename)
+
+        expired = time.time() - self.retention
+        self.jobs = {id: j for id, j in self.jobs.items()
+                     if (j.finished or time.time()) >= expired}
+        self.jobs[job.id] = job
+        self.save(job)
+        self.spawn(self.run, job, MultiDict(request.form), uploads)
+        return job
+
+    def run(self, job: Job, form: MultiDict, uploads: dict):
+        def update(stage, done=None, total=None):
+            job.stage, job.done, job.total = stage, done, total
+
+        job.status = 'running'
+        self.save(job)
+        try:
+            upload_bytes = sum(
+                os.path.getsize(path) for path, _ in uploads.values())
+            # jobs wait their turn, rather than being refused
+            with self.offload.admitted(upload_bytes, wait=True) \
+                    if self.offload.workers else nullcontext():
+                _, headers, path = self.offload.call(
+                    update, function=job.function,
+                    form=list(form.items(multi=True)), uploads=uploads)
+            update('save')
+            self.results.move(job.id, path)
+
+            headers = Headers(headers)
+            _, options = parse_options_header(
+                headers.get('Content-Disposition', ''))
+            job.filename = options.get('filename', f'{job.function}')
+            job.mimetype, _ = parse_options_header(
+                headers.get('Content-Type', ''))
+            job.status = 'finished'
+        except Exception as e:
+            print(traceback.format_exc())
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            for path, _ in uploads.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            job.finished = time.time()
+            self.save(job)
+
+    def save(self, job: Job):
+        self.states.write(job.id, lambda file: file.write(
+            json.dumps(job.to_dict()).encode()))
+
+    def get(self, id: str) -> Optional[Job]:
+        if id in self.jobs:
+            return self.jobs[id]
+        if not id.isalnum():
+            return None
+
+        def load(path):
+            with open(path) as file:
+                return Job(**json.load(file))
+        # jobs of previous runs, interrupted unless finished
+        job = self.states.read(id, load)
+        if job is not None and job.finished is None:
+            job.status = 'failed'
+            job.error = 'Interrupted by a server restart'
+        return job
+
+    def result(self, id: str):
+        """
+        Download response of a finished job's result, None if unavailable.
+
+        """
+        job = self.get(id)
+        if job is None or job.status != 'finished':
+            return None
+        path = self.results.read(id, lambda path: path)
+        if path is None:
+            return None
+        return send_file(path, job.mimetype, download_name=job.filename,
+                         as_attachment=True)
@@ -1,29 +1,102 @@
 import pandas as pd
+from functools import partial
 from typing import Optional
+from ..utils.diff import diff_partitioned
 from ..utils.common import (
     dedup,
+    read_csv,
     hash_cols,
     lowercase,
     condo_coop_mask,
 )
 
+# columns identifying a contact across files
+INDEX = [
+    'RegistrationContactID',
+    'RegistrationID',
+    'FirstName',
+    'MiddleInitial',
+    'LastName',
+]
+DTYPE = {
+    'RegistrationContactID': 'UInt32',
+    'RegistrationID': 'UInt32'
+}
+# rows per chunk of partitioned diffs
+CHUNK_SIZE = 100_000
 
-def prepare(contacts_file, index, new=False):
-    dfc = pd.read_csv(contacts_file, dtype={
-        'RegistrationContactID': 'UInt32',
-        'RegistrationID': 'UInt32'
-    })
+
+def clean(dfc, new=False):
+    """
+    Rows of contacts as compared, new ones being condo/co-op only.
+
+    """
     if new:
         dfc = dfc[condo_coop_mask(dfc)]
-    dfc = lowercase(dfc).drop_duplicates()
+    return lowercase(dfc)
+
+
+def deduplicate(dfc, index=INDEX):
+    """
+    Cleaned contacts with values of duplicate `index` rows concatenated,
+    indexed by a hash of `index`.
+
+    """
+    dfc = dfc.drop_duplicates()
     # concat values for duplicate index rows
     dfc = dedup(dfc, index)
     index_col = pd.Index(hash_cols(dfc[index]), name='hash')
     return dfc.set_index(index_col)
 
 
-def post_process(contacts, buildings, old_rids,
+def index_hash(dfc, index=INDEX):
+    """
+    Hash of each row's `index` as deduplicate indexes it.
+
+    """
+    return hash_cols(dfc[index]).to_numpy()
+
+
+def prepare(contacts_file, index=INDEX, new=False):
+    dfc = read_csv(contacts_file, dtype=DTYPE)
+    return deduplicate(clean(dfc, new), index)
+
+
+def clean_chunks(contacts_file, new=False, chunksize=CHUNK_SIZE):
+    for dfc in read_csv(contacts_file, dtype=DTYPE, chunksize=chunksize):
+        yield clean(dfc, new)
+
+
+def diff_chunks(old_chunks, new_chunks, buckets, old_prepared=False,
+                index=INDEX, **kwargs):
+    """
+    diff_frames of contacts read in chunks through buckets of rows
+    sharing their `index` hash, hence its duplicates too.
+
+    Parameters
+    ----------
+    old_chunks    : clean_chunks of old contacts, or prepared contacts
+        in chunks if `old_prepared`, e.g. of a snapshot
+    new_chunks    : clean_chunks of new contacts
+    buckets       : number of buckets
+    kwargs        : of diff_partitioned
+
+    """
+    return diff_partitioned(
+        old_chunks, new_chunks, partial(index_hash, index=index), buckets,
+        prepare_old=None if old_prepared else partial(
+            deduplicate, index=index),
+        prepare_new=partial(deduplicate, index=index),
+        **kwargs)
+
+
+def post_process(contacts, buildings, building_cols, old_rids,
                  col_order: Optional[dict] = None):
+    """
+    Mark new buildings, merge `building_cols` of their buildings
+    from `buildings`, a BuildingIndex, match zips and order columns.
+
+    """
     dfc = contacts
 
     # detect new-buildings
@@ -35,8 +108,11 @@ def post_process(contacts, buildings, old_rids,
         'ChangeType'] = 'new-building'
 
     # merge buildings info
-    buildings.columns = buildings.columns.map(lambda c: (c, ''))
-    dfc = dfc.merge(buildings, on='RegistrationID', how='left')
+    positions, columns = buildings.merge(
+        dfc[('RegistrationID', '')], building_cols)
+    dfc = dfc.take(positions).reset_index(drop=True)
+    for col, values in columns.items():
+        dfc[(col, '')] = values
 
     # zip match
     biz_zip_col = ('BusinessZip', 'new')
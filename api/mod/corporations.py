@@ -1,41 +1,66 @@
 import pandas as pd
+from typing import Optional
 from ..utils.common import (
+    read_csv,
     condo_coop_mask,
     not_contains_mask,
 )
+from ..utils.buildings import BuildingIndex
+
+# rows per chunk, ~10MB of raw contacts CSV
+CHUNK_SIZE = 100_000
+
+
+def read_chunks(file, chunksize: Optional[int], **kwargs):
+    if chunksize is None:
+        return [read_csv(file, **kwargs)]
+    return read_csv(file, chunksize=chunksize, **kwargs)
 
 
 def prepare(
-        contacts_file, buildings_file,
-        building_cols, filter_keywords):
+        contacts_file, buildings,
+        building_cols, filter_keywords,
+        chunksize: Optional[int] = CHUNK_SIZE):
+    """
+    Count distinct registrations of condo/co-op corporations
+    and sum their `building_cols`.
+
+    Contacts are read in chunks of `chunksize` rows, None to read
+    them whole, reduced to the condo/co-op registration and corporation
+    name pairs as they're read. Building sums per registration come from
+    `buildings`, a BuildingIndex or the file to build one of.
+
+    """
     dtype = {
         'RegistrationID': 'UInt32',
         'CorporationName': 'string',
         'ContactDescription': 'string'}
-    df = pd.read_csv(
-        contacts_file,
+    chunks = read_chunks(
+        contacts_file, chunksize,
         usecols=dtype.keys(),
-        dtype=dtype).dropna(
-        subset='CorporationName')
+        dtype=dtype)
 
-    # extract relevant subset
-    df = df[condo_coop_mask(df)]
-    df = df[not_contains_mask(df['CorporationName'], filter_keywords,
-                              regex=False, case=False)]
-    df = df[['RegistrationID', 'CorporationName']].drop_duplicates()
+    dfs = []
+    for df in chunks:
+        df = df.dropna(subset='CorporationName')
+        # extract relevant subset
+        df = df[condo_coop_mask(df)]
+        df = df[not_contains_mask(df['CorporationName'], filter_keywords,
+                                  regex=False, case=False)]
+        dfs.append(df[['RegistrationID', 'CorporationName']].drop_duplicates())
+    # pairs may repeat across chunks, first occurrences keep their order
+    df = pd.concat(dfs).drop_duplicates()
+    del dfs
 
     dfbs = None
     if building_cols:
-        buildings = pd.read_csv(
-            buildings_file,
-            usecols=building_cols + ['RegistrationID'],
-            dtype='UInt32')
-        dfbs = df.merge(
-            buildings,
-            on='RegistrationID').drop(
-            'RegistrationID',
-            axis=1)
-        dfbs = dfbs.groupby('CorporationName').sum()
+        if not isinstance(buildings, BuildingIndex):
+            buildings = BuildingIndex(buildings)
+        # summed in file order, as read_csv would have read them
+        sums = buildings.sum([col for col in buildings.header
+                              if col in building_cols], 'UInt32')
+        dfbs = df.join(sums, on='RegistrationID', how='inner').drop(
+            'RegistrationID', axis=1).groupby('CorporationName').sum()
 
     count = df.groupby('CorporationName').size().rename('Count')
     # sorting has added benefit of optimizing fuzzyfy:
@@ -0,0 +1,429 @@
+import os
+import time
+import atexit
+import shutil
+import tempfile
+import traceback
+import multiprocessing
+from contextlib import contextmanager, ExitStack
+from typing import Callable, Optional
+from flask import Flask, Response, request
+from gevent.event import Event
+from gevent.queue import Queue
+from gevent.socket import wait_read
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import (
+    LengthRequired, ServiceUnavailable, RequestEntityTooLarge)
+from .process import RPC, RPC_WORKERS, metrics
+from .utils import progress
+
+# calls waiting for a worker or upload bytes, beyond which calls are refused
+RPC_MAX_QUEUED = int(os.environ.get('RPC_MAX_QUEUED', 32))
+# total size of request bodies of calls in flight
+RPC_MAX_UPLOAD_BYTES = int(os.environ.get('RPC_MAX_UPLOAD_BYTES', 2 << 30))
+# seconds between progress reports of a stage sent by workers
+PROGRESS_INTERVAL = 0.5
+# largest response chunk sent at once by workers streaming a response
+STREAM_CHUNK_BYTES = 1 << 20
+# request headers the RPC functions' responses depend on
+FORWARDED_HEADERS = ('Content-Type', 'Accept-Encoding')
+
+
+def call(app, file, body: Optional[str] = None,
+         form=(), uploads: Optional[dict] = None, headers=(),
+         function: Optional[str] = None, start: Optional[Callable] = None):
+    """
+    Run an RPC function in a request context of either the raw request
+    `body` saved at a path, or `form` along with `uploads` of
+    {name: (path, filename)}, writing its response body to `file`,
+    after passing its status and headers to `start`, if any.
+
+    Returns
+    -------
+    (status, headers) of the response.
+
+    """
+    with ExitStack() as stack:
+        if body is not None:
+            args = dict(input_stream=stack.enter_context(open(body, 'rb')),
+                        headers=[*headers, (
+                            'Content-Length', str(os.path.getsize(body)))])
+        else:
+            data = MultiDict(form)
+            for name, (path, filename) in (uploads or {}).items():
+                data[name] = (stack.enter_context(open(path, 'rb')), filename)
+            args = dict(data=data, headers=headers)
+
+        with app.test_request_context('/process', method='POST', **args):
+            function = function or request.form.get('function')
+            if function not in RPC:
+                raise ValueError(f'Unknown function {function}')
+            response = RPC[function]()
+            try:
+                if start is not None:
+                    start(response.status_code, list(response.headers.items()))
+                for chunk in response.response:
+                    file.write(chunk)
+            finally:
+                response.close()
+    return response.status_code, list(response.headers.items())
+
+
+class PipeWriter:
+    """
+    File-like sending what's written to it over `conn` as response chunks
+    of atmost STREAM_CHUNK_BYTES.
+
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, chunk: bytes):
+        for start in range(0, len(chunk), STREAM_CHUNK_BYTES):
+            self.conn.send(('chunk', chunk[start:start + STREAM_CHUNK_BYTES]))
+
+
+def serve(conn, directory: str):
+    """
+    Worker process loop: run the calls received on `conn` one at a time,
+    sending back their progress, then their response body's path and
+    headers, or their error, along with the profiles of the calls.
+    Calls to `stream` send their status and headers, then their body
+    in chunks as it's written, instead of saving it.
+
+    """
+    app = Flask('HousingAnalytics')
+    metrics.profiles = []
+    reported = [None, 0.]
+
+    def report(stage, done=None, total=None):
+        now = time.monotonic()
+        if stage == reported[0] and now - reported[1] < PROGRESS_INTERVAL:
+            return
+        reported[:] = stage, now
+        conn.send(('progress', stage, done, total))
+
+    progress.callback.set(report)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        reported[0] = None
+        stream = message.pop('stream', False)
+        path = None
+        try:
+            if stream:
+                status, headers = call(
+                    app, PipeWriter(conn), **message,
+                    start=lambda *start: conn.send(('start', *start)))
+            else:
+                fd, path = tempfile.mkstemp(dir=directory, suffix='.response')
+                with os.fdopen(fd, 'wb') as file:
+                    status, headers = call(app, file, **message)
+            result = (status, headers, path, None)
+        except Exception as e:
+            print(traceback.format_exc())
+            if path is not None:
+                os.remove(path)
+            result = (None, None, None, str(e))
+        conn.send(('result', *result, metrics.profiles))
+        metrics.profiles = []
+
+
+class Worker:
+    """
+    Worker process serving calls sent over a pipe, one at a time.
+    Spawned rather than forked, since the server's gevent hub and
+    monkey patched threads don't survive a fork.
+
+    """
+
+    def __init__(self, directory: str):
+        context = multiprocessing.get_context('spawn')
+        self.conn, conn = context.Pipe()
+        # sockets of monkey patched socketpair are non-blocking,
+        # whereas the worker blocks on them and the server waits to read
+        for end in (self.conn, conn):
+            os.set_blocking(end.fileno(), True)
+        # not daemonic, since fuzzyfy may start processes of its own
+        self.process = context.Process(target=serve, args=(conn, directory))
+        self.process.start()
+        conn.close()
+
+    def receive(self, update: Optional[Callable] = None):
+        """
+        Wait for the next message of the running call other than
+        its progress without blocking other greenlets,
+        passing its progress on to `update`.
+
+        """
+        while True:
+            wait_read(self.conn.fileno())
+            kind, *payload = self.conn.recv()
+            if kind != 'progress':
+                return kind, payload
+            if update is not None:
+                update(*payload)
+
+    def call(self, message: dict, update: Optional[Callable] = None):
+        """
+        Send a call and wait for its result, refer to `receive`.
+
+        """
+        self.conn.send(message)
+        _, result = self.receive(update)
+        return result
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class Offload:
+    """
+    Run RPC calls in a pool of `workers` processes, so that the server's
+    single gevent loop keeps serving other requests while they compute.
+
+    Calls are admitted while the request bodies of calls in flight are
+    within `max_upload_bytes` and a worker is free, otherwise queued,
+    atmost `max_queued` of them, beyond which they're refused with 503.
+    Responses are streamed from workers as they're written, whereas
+    results of `call`, e.g. of jobs, are written under `directory`.
+
+    Parameters
+    ----------
+    directory         : created if missing, to keep request bodies and results.
+    workers           : number of processes, i.e. calls running at once,
+        0 to run calls in the server process.
+    max_queued        : number of calls waiting to be admitted.
+    max_upload_bytes  : total size of request bodies of calls in flight.
+
+    """
+
+    def __init__(self, directory: str, workers: int = RPC_WORKERS,
+                 max_queued: int = RPC_MAX_QUEUED,
+                 max_upload_bytes: int = RPC_MAX_UPLOAD_BYTES):
+        self.directory = directory
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_upload_bytes = max_upload_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.app = Flask('HousingAnalytics')
+        self.pool = []
+        self.idle = Queue()
+        self.queued = 0
+        self.upload_bytes = 0
+        self.released = Event()
+        atexit.register(self.stop)
+
+    def start(self):
+        """
+        Start all workers, instead of on demand, to import
+        their modules before the first calls.
+
+        """
+        while len(self.pool) < self.workers:
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        worker = Worker(self.directory)
+        self.pool.append(worker)
+        return worker
+
+    def stop(self):
+        for worker in self.pool:
+            worker.stop()
+        self.pool = []
+
+    def checkout(self):
+        if self.idle.empty() and len(self.pool) < self.workers:
+            return self.spawn()
+        return self.idle.get()
+
+    def replace(self, worker: Worker):
+        self.pool.remove(worker)
+        worker.kill()
+        return self.spawn()
+
+    @contextmanager
+    def admitted(self, upload_bytes: int = 0, wait: bool = False):
+        """
+        Admit a call whose request body is of `upload_bytes`, once the
+        bodies of calls in flight are within max_upload_bytes along with it.
+        Calls queued beyond max_queued are refused unless `wait`.
+
+        """
+        if upload_bytes > self.max_upload_bytes:
+            raise RequestEntityTooLarge(
+                f'Upload of {upload_bytes} bytes exceeds '
+                f'{self.max_upload_bytes} bytes')
+        if not wait and self.queued >= self.max_queued:
+            raise ServiceUnavailable(
+                f'{self.queued} requests queued, try again later')
+
+        self.queued += 1
+        try:
+            while self.upload_bytes + upload_bytes > self.max_upload_bytes:
+                self.released.clear()
+                self.released.wait()
+        finally:
+            self.queued -= 1
+
+        self.upload_bytes += upload_bytes
+        try:
+            yield
+        finally:
+            self.upload_bytes -= upload_bytes
+            self.released.set()
+
+    @contextmanager
+    def checked_out(self):
+        """
+        Next free worker, replaced by a fresh one unless
+        left waiting for its next call.
+
+        """
+        self.queued += 1
+        try:
+            worker = self.checkout()
+        finally:
+            self.queued -= 1
+        try:
+            yield worker
+        except BaseException as e:
+            # died e.g. out of memory, or left running a call
+            # no one waits for anymore, hence replaced by a fresh worker
+            worker = self.replace(worker)
+            if isinstance(e, (EOFError, OSError)):
+                raise RuntimeError('Worker process died') from e
+            raise
+        finally:
+            self.idle.put(worker)
+
+    @staticmethod
+    def finished(error: Optional[str], profiles: list):
+        for profile, outcome in profiles:
+            metrics.add(profile, outcome)
+        if error is not None:
+            raise RuntimeError(error)
+
+    def call(self, update: Optional[Callable] = None, **message):
+        """
+        Run an RPC call described by `message`, refer to `call`, on the
+        next free worker, passing its progress on to `update`,
+        and add its profiles to metrics.
+
+        Returns
+        -------
+        (status, headers, path) of the response, whose body is
+        saved at path, which the caller must remove.
+
+        """
+        if not self.workers:
+            return self.call_here(update, **message)
+
+        with self.checked_out() as worker:
+            status, headers, path, error, profiles = worker.call(
+                message, update)
+        self.finished(error, profiles)
+        return status, headers, path
+
+    def stream(self, update: Optional[Callable] = None, **message):
+        """
+        Run an RPC call like `call`, its response body streamed from
+        the worker as it's written rather than saved first, or
+        from the file saved by call_here without workers.
+
+        Returns
+        -------
+        (status, headers, chunks) of the response, the worker being busy
+        until `chunks`, a generator of its body, is exhausted or closed.
+
+        """
+        def saved():
+            status, headers, path = self.call_here(update, **message)
+            try:
+                yield status, headers
+                with open(path, 'rb') as file:
+                    yield from iter(lambda: file.read(1 << 16), b'')
+            finally:
+                os.remove(path)
+
+        def streamed():
+            with self.checked_out() as worker:
+                worker.conn.send({**message, 'stream': True})
+                kind, payload = worker.receive(update)
+                try:
+                    while kind != 'result':
+                        yield payload if kind == 'start' else payload[0]
+                        kind, payload = worker.receive(update)
+                except GeneratorExit:
+                    # left by the client, the rest of the response is
+                    # dropped rather than its worker replaced
+                    while kind != 'result':
+                        kind, payload = worker.receive()
+                    self.finished(None, payload[4])
+                    return
+            self.finished(*payload[3:])
+
+        chunks = streamed() if self.workers else saved()
+        # started, hence closed by the response even if never iterated
+        status, headers = next(chunks)
+        return status, headers, chunks
+
+    def call_here(self, update: Optional[Callable] = None, **message):
+        token = progress.callback.set(update) if update else None
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.response')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                status, headers = call(self.app, file, **message)
+        except BaseException:
+            os.remove(path)
+            raise
+        finally:
+            if token is not None:
+                progress.callback.reset(token)
+        return status, headers, path
+
+    def process(self):
+        """
+        Response of the RPC call of the current request, whose body
+        is saved as is, once admitted, for a worker to parse,
+        streamed back as the worker writes it.
+        Requests without a Content-Length, e.g. chunked, are refused
+        since their size isn't known before admitting them.
+
+        """
+        upload_bytes = request.content_length
+        if upload_bytes is None:
+            raise LengthRequired('Request body must have a Content-Length')
+        with ExitStack() as stack:
+            stack.enter_context(self.admitted(upload_bytes))
+            fd, body = tempfile.mkstemp(dir=self.directory, suffix='.request')
+            stack.callback(os.remove, body)
+            with os.fdopen(fd, 'wb') as file:
+                shutil.copyfileobj(request.stream, file, 1 << 20)
+            status, headers, chunks = self.stream(body=body, headers=[
+                (name, request.headers[name])
+                for name in FORWARDED_HEADERS if name in request.headers])
+            # admitted until streamed, the call may read its body lazily
+            stack = stack.pop_all()
+
+        response = Response(chunks, status, headers)
+        response.call_on_close(chunks.close)
+        response.call_on_close(stack.close)
+        return response
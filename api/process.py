@@ -1,94 +1,340 @@
-from flask import request
+import os
+import pandas as pd
+from functools import wraps
+from flask import Response, request, jsonify
 from .mod import contacts, corporations
-from .utils.diff import diff_frames
-from .utils.fuzzy import fuzzyfy
+from .utils.diff import diff_frames, DIFF_BUCKET_ROWS
+from .utils.fuzzy import fuzzyfy, fuzzyfy_thresholds
+from .utils.groups import GroupStore, incremental_fuzzyfy
+from .utils.cache import DiskCache, CACHE_DIR, CACHE_MAX_BYTES
+from .utils.datasets import DatasetStore
+from .utils.snapshots import SnapshotStore, SNAPSHOTS_MANAGED
+from .utils.buildings import BuildingIndexes
+from .utils.search import NameIndexes
+from .utils.spawned import FramePool
+from .utils.progress import report
+from .utils.metrics import Metrics, rows
 from .utils.common import (
     export,
-    read_csv,
+    export_sheets,
     filename,
     parse_list,
     condo_coop_mask,
     ExportType,
+    EXCEL_MAX_ROWS,
 )
 
 RPC = dict()
 
+# worker processes running RPC calls, 0 to run them in the server process,
+# few by default since each keeps its own in-memory caches
+RPC_WORKERS = int(os.environ.get('RPC_WORKERS', min(2, os.cpu_count() or 1)))
+# processes kept to prepare compare_contacts' old and new contacts in,
+# while buildings are indexed in this one, 0 to prepare them in this one,
+# by default atmost 2 per RPC worker and a process per core in all
+PREPARE_WORKERS = int(os.environ.get('PREPARE_WORKERS', max(0, min(
+    2, (os.cpu_count() or 1) // max(RPC_WORKERS, 1) - 1))))
+# rows of contacts below which they're prepared in this process,
+# faster than through another
+PREPARE_WORKERS_MIN_ROWS = int(os.environ.get(
+    'PREPARE_WORKERS_MIN_ROWS', 100_000))
+
+fuzzy_cache = DiskCache(os.path.join(CACHE_DIR, 'fuzzy'), suffix='.npz') \
+    if CACHE_MAX_BYTES else None
+datasets = DatasetStore(os.path.join(CACHE_DIR, 'datasets'))
+snapshots = SnapshotStore()
+fuzzy_groups = GroupStore(os.path.join(CACHE_DIR, 'groups'))
+building_indexes = BuildingIndexes()
+name_indexes = NameIndexes(os.path.join(CACHE_DIR, 'names'))
+frame_pool = FramePool(PREPARE_WORKERS)
+metrics = Metrics()
+
 
 def register(fn):
-    RPC[fn.__name__] = fn
-    return fn
+    """
+    Register fn as an RPC function, profiled by metrics: its stages'
+    timings are returned in the Server-Timing header as well.
+
+    """
+    @wraps(fn)
+    def rpc():
+        with metrics.profiled(fn.__name__) as profile:
+            response = fn()
+        response.headers['Server-Timing'] = profile.server_timing()
+        return response
+
+    RPC[fn.__name__] = rpc
+    return rpc
+
+
+def dataset(name):
+    """
+    Uploaded file `name` registered as a dataset,
+    or else the dataset previously registered as form field `name`-id.
+
+    """
+    file = request.files.get(name)
+    if file:
+        return datasets.register(file)
+    return datasets.get(request.form.get(f'{name}-id'))
+
+
+@register
+def list_datasets():
+    """
+    Datasets of the IDs sent as dataset-ids, comma separated, and of
+    uploaded files, so that clients only list datasets they uploaded.
+
+    """
+    ids = parse_list(request.form.get('dataset-ids'))
+    for name in request.files:
+        if request.files[name]:
+            ids.append(datasets.register(request.files[name]).id)
+    return jsonify(datasets.list(ids))
 
 
 @register
 def corporation_count():
-    contacts_file = request.files.get('registration')
-    buildings_file = request.files.get('buildings')
+    contacts_file = dataset('registration')
     building_cols = parse_list(request.form.get('building-columns'))
+    buildings = building_indexes.get(dataset('buildings')) \
+        if building_cols else None
     filter_keywords = parse_list(request.form.get('filter-keywords'))
+    report('prepare')
     df = corporations.prepare(
         contacts_file,
-        buildings_file,
+        buildings,
         building_cols,
         filter_keywords)
+    rows(contacts_file.rows, len(df))
 
-    similarity = float(request.form.get('similarity') or 0)
-    if similarity:
+    # each similarity once, e.g. 90 of 90,90 is a single run
+    similarities = list(dict.fromkeys(s for s in map(
+        float, parse_list(request.form.get('similarity'))) if s))
+    similarity = similarities[0] if similarities else 0
+    file_name = filename(contacts_file, 'registration')
+    if similarities:
         ignore_keywords = parse_list(request.form.get('ignore-keywords'))
-        df = fuzzyfy(df, similarity, ignore_keywords)
+        workers = int(request.form.get('workers') or 1)
+        rebuild = bool(request.form.get('rebuild'))
+        names = len(df)
+        if len(similarities) > 1:
+            if request.form.get('incremental') or rebuild:
+                raise ValueError(
+                    'Incremental runs take a single similarity')
+            dfs = fuzzyfy_thresholds(df, similarities, ignore_keywords,
+                                     workers=workers, cache=fuzzy_cache)
+            lengths = [len(dff) for dff in dfs.values()]
+            rows(names, sum(lengths))
 
-    file_name = filename(contacts_file, 'registration')
+            report('export')
+            rows(sum(lengths))
+            sheets = {f'{s:g}': dff for s, dff in dfs.items()}
+            export_type = ExportType.ZIP
+            # a sheet's rows follow its header row
+            if max(lengths) < EXCEL_MAX_ROWS:
+                export_type = ExportType.EXCEL
+                sheets = {name: dff.set_index(dff.columns[0])
+                          for name, dff in sheets.items()}
+            return export_sheets(sheets, (
+                f'corporation-count-{file_name}-'
+                f'{"-".join(sheets)}'), export_type)
+        elif request.form.get('incremental') or rebuild:
+            df = incremental_fuzzyfy(df, fuzzy_groups,
+                                     request.form.get('series') or '',
+                                     similarity, ignore_keywords,
+                                     rebuild=rebuild,
+                                     workers=workers, cache=fuzzy_cache)
+        else:
+            df = fuzzyfy(df, similarity, ignore_keywords, workers=workers,
+                         cache=fuzzy_cache)
+        rows(names, len(df))
+
+    report('export')
+    rows(len(df))
     return export(df, f'corporation-count-{file_name}-{similarity}')
 
 
 @register
-def compare_contacts():
-    buildings = request.files.get('buildings')
-    contacts_old = request.files.get('contacts-old')
-    contacts_new = request.files.get('contacts-new')
+def similar_corporations():
+    contacts_file = dataset('registration')
+    ignore_keywords = parse_list(request.form.get('ignore-keywords'))
+    # one name per line, typed or uploaded
+    names_file = request.files.get('names-file')
+    names = names_file.read().decode('utf-8-sig') if names_file \
+        else request.form.get('names') or ''
+    names = [name.strip() for name in names.splitlines() if name.strip()]
+    limit = int(request.form.get('limit') or 10)
+    similarity = float(request.form.get('similarity') or 0)
+    workers = int(request.form.get('workers') or 1)
 
-    old_name = filename(contacts_old, 'old')
-    new_name = filename(contacts_new, 'new')
+    report('index')
+    index = name_indexes.get(contacts_file, ignore_keywords)
+    report('search')
+    df = index.search(names, limit, similarity, workers)
+    rows(len(names), len(df))
 
-    index = [
-        'RegistrationContactID',
-        'RegistrationID',
-        'FirstName',
-        'MiddleInitial',
-        'LastName',
-    ]
+    if names_file:
+        report('export')
+        file_name = filename(contacts_file, 'registration')
+        return export(df, f'similar-corporations-{file_name}')
+    return Response(df.to_json(orient='records'),
+                    mimetype='application/json')
 
-    contacts_old = contacts.prepare(contacts_old, index)
-    contacts_new = contacts.prepare(contacts_new, index, new=True)
 
-    old_rids = contacts_old['RegistrationID'].copy()
+def prepare_parallel(contacts_old, contacts_new, snapshot: bool,
+                     building_cols: list[str]):
+    """
+    compare_contacts' inputs prepared at once: old and new contacts,
+    unless old is a snapshot, each by a worker of frame_pool, while
+    the buildings dataset is indexed and its `building_cols` loaded here.
 
-    dfc = diff_frames(
-        contacts_old,
-        contacts_new,
+    Returns
+    -------
+    (old contacts, new contacts, BuildingIndex)
+
+    """
+    index = contacts.INDEX
+    spawned = [frame_pool.submit(contacts.prepare, contacts_new, index, True)]
+    if not snapshot:
+        spawned.append(
+            frame_pool.submit(contacts.prepare, contacts_old, index))
+    try:
+        buildings = building_indexes.get(dataset('buildings'))
+        buildings.load(building_cols)
+        if snapshot:
+            contacts_old = contacts_old.read()
+        contacts_new = spawned[0].result()
+        if not snapshot:
+            contacts_old = spawned[1].result()
+    finally:
+        for frame in spawned:
+            frame.close()
+    return contacts_old, contacts_new, buildings
+
+
+@register
+def compare_contacts():
+    snapshot = request.form.get('snapshot')
+    contacts_new = dataset('contacts-new')
+    new_name = filename(contacts_new, 'new')
+    index = contacts.INDEX
+
+    if snapshot:
+        contacts_old = snapshots.get(snapshot)
+        old_name = snapshot
+    else:
+        contacts_old = dataset('contacts-old')
+        old_name = filename(contacts_old, 'old')
+
+    diff_args = dict(
         ignore_cols=(*index,),
         show_atleast=(*index, 'BusinessZip'),
         removed_mask=condo_coop_mask)
 
-    del contacts_old, contacts_new
-
-    columns = ['BuildingID', 'Zip', 'RegistrationID'] + \
+    columns = ['BuildingID', 'Zip'] + \
         parse_list(request.form.get('building-columns'))
+    buildings = None
 
-    if not dfc.empty:
-        buildings = read_csv(buildings, usecols=columns,
-                             dtype={'BuildingID': 'UInt32',
-                                    'RegistrationID': 'UInt32'})
+    buckets = -(-max(contacts_old.rows, contacts_new.rows)
+                // DIFF_BUCKET_ROWS) if DIFF_BUCKET_ROWS else 1
+    if buckets > 1:
+        old_rids = []
+
+        def old_chunks(source):
+            chunks = source.read(chunksize=contacts.CHUNK_SIZE) \
+                if snapshot else contacts.clean_chunks(source)
+            for chunk in chunks:
+                old_rids.append(chunk['RegistrationID'].drop_duplicates())
+                yield chunk
 
+        report('partition')
+        dfc = contacts.diff_chunks(
+            old_chunks(contacts_old),
+            contacts.clean_chunks(contacts_new, new=True),
+            buckets,
+            old_prepared=bool(snapshot),
+            **diff_args)
+        rows(contacts_old.rows + contacts_new.rows, len(dfc))
+        old_rids = pd.concat(old_rids)
+    else:
+        old_rows, new_rows = contacts_old.rows, contacts_new.rows
+        if PREPARE_WORKERS and \
+                max(old_rows, new_rows) >= PREPARE_WORKERS_MIN_ROWS:
+            report('prepare')
+            contacts_old, contacts_new, buildings = prepare_parallel(
+                contacts_old, contacts_new, bool(snapshot), columns)
+            rows(old_rows + new_rows, len(contacts_old) + len(contacts_new))
+        else:
+            if snapshot:
+                report('load snapshot')
+                contacts_old = contacts_old.read()
+            else:
+                report('prepare old')
+                contacts_old = contacts.prepare(contacts_old, index)
+            rows(old_rows, len(contacts_old))
+            report('prepare new')
+            contacts_new = contacts.prepare(contacts_new, index, new=True)
+            rows(new_rows, len(contacts_new))
+
+        old_rids = contacts_old['RegistrationID'].copy()
+
+        report('diff')
+        dfc = diff_frames(contacts_old, contacts_new, **diff_args)
+        rows(len(contacts_old) + len(contacts_new), len(dfc))
+
+    del contacts_old, contacts_new
+
+    if not dfc.empty:
+        report('post process')
+        diff_rows = len(dfc)
         dfc = contacts.post_process(
-            dfc, buildings, old_rids=old_rids,
+            dfc, buildings if buildings is not None
+            else building_indexes.get(dataset('buildings')),
+            columns,
+            old_rids=old_rids,
             col_order={'first': ('ChangeType', *index),
                        'last': ('BusinessZip', 'Zip', 'ZipMatch')})
+        rows(diff_rows, len(dfc))
 
-        del buildings, old_rids
+        del old_rids
 
     export_type = ExportType.EXCEL
 
     if export_type == ExportType.EXCEL:
         dfc = dfc.set_index('ChangeType')
 
+    report('export')
+    rows(len(dfc))
     return export(dfc, f'compare-{old_name}-{new_name}', export_type)
+
+
+@register
+def save_snapshot():
+    contacts_file = dataset('contacts')
+    name = request.form.get('snapshot-name') or ''
+    report('prepare')
+    df = contacts.prepare(contacts_file)
+    rows(contacts_file.rows, len(df))
+    report('save')
+    snapshots.save(name, df, contacts_file.filename)
+    return jsonify(snapshots.list([name]))
+
+
+def managed_snapshots():
+    if not SNAPSHOTS_MANAGED:
+        raise ValueError('Listing and deleting snapshots is disabled, '
+                         'set SNAPSHOTS_MANAGED=1 on private servers')
+
+
+@register
+def list_snapshots():
+    managed_snapshots()
+    return jsonify(snapshots.list())
+
+
+@register
+def delete_snapshot():
+    managed_snapshots()
+    snapshots.delete(request.form.get('snapshot-name') or '')
+    return jsonify(snapshots.list())
@@ -0,0 +1,147 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Optional
+from .common import read_csv
+from .datasets import Dataset, DTYPES
+
+BUILDINGS_CACHE_BYTES = int(os.environ.get('BUILDINGS_CACHE_BYTES', 256 << 20))
+
+KEY = 'RegistrationID'
+
+
+class BuildingIndex:
+    """
+    Buildings sorted by RegistrationID, the rows of each registration
+    found by binary search, to merge their columns into contacts
+    and sum them per registration without joining the whole file.
+    Columns are read once on first use, after which the BuildingIndexes
+    keeping the index, if any, evicts indexes beyond its size.
+
+    """
+
+    def __init__(self, file, indexes: Optional['BuildingIndexes'] = None):
+        self.file = file
+        self.indexes = indexes
+        # column names in file order
+        if isinstance(file, Dataset):
+            self.header = list(file.columns)
+        else:
+            self.header = list(pd.read_csv(file, nrows=0).columns)
+        rids = self.read([KEY])[KEY].to_numpy('int64', na_value=-1)
+        self.order = np.argsort(rids, kind='stable')
+        # missing registrations sort first as -1, matched as pandas would
+        self.registrations, self.starts, counts = np.unique(
+            rids[self.order], return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+        self.columns = {}
+        self.sums = {}
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.order, self.registrations, self.starts, self.ends,
+            *self.columns.values(), *self.sums.values()))
+
+    def grown(self):
+        if self.indexes is not None:
+            self.indexes.evict()
+
+    def read(self, columns):
+        if hasattr(self.file, 'seek'):
+            self.file.seek(0)
+        return read_csv(self.file, usecols=columns, dtype={
+            col: dtype for col, dtype in DTYPES.items() if col in columns})
+
+    def load(self, columns):
+        """
+        Columns sorted by RegistrationID.
+
+        """
+        missing = [col for col in dict.fromkeys(columns)
+                   if col not in self.columns]
+        if missing:
+            df = self.read(missing)
+            for col in missing:
+                array = df[col].array
+                if isinstance(array, pd.arrays.NumpyExtensionArray):
+                    array = array.to_numpy()
+                self.columns[col] = array.take(self.order)
+            self.grown()
+        return {col: self.columns[col] for col in columns}
+
+    def merge(self, rids: pd.Series, columns: list[str]):
+        """
+        contacts.merge(buildings[columns + [RegistrationID]],
+        on='RegistrationID', how='left') given contacts' `rids`:
+        positions of contacts repeated for each of their buildings
+        and the buildings' columns, missing for contacts without any.
+
+        """
+        keys = rids.to_numpy('int64', na_value=-1)
+        i = np.searchsorted(self.registrations, keys).clip(
+            max=max(len(self.registrations) - 1, 0))
+        found = self.registrations[i] == keys if len(self.registrations) \
+            else np.zeros(len(keys), bool)
+        counts = np.where(found, self.ends[i] - self.starts[i], 0)
+        repeats = np.maximum(counts, 1)
+
+        left = np.repeat(np.arange(len(keys)), repeats)
+        offsets = np.arange(len(left)) - np.repeat(
+            np.cumsum(repeats) - repeats, repeats)
+        right = np.where(np.repeat(found, repeats),
+                         np.repeat(self.starts[i], repeats) + offsets, -1)
+
+        return left, {
+            col: pd.api.extensions.take(array, right, allow_fill=True)
+            for col, array in self.load(columns).items()}
+
+    def sum(self, columns: list[str], dtype: Optional[str] = None):
+        """
+        Sums of `columns` as `dtype` per RegistrationID, like
+        buildings.astype(dtype).groupby('RegistrationID').sum()
+        except that missing registrations are -1.
+
+        """
+        missing = [col for col in columns if (col, dtype) not in self.sums]
+        if missing:
+            df = pd.DataFrame(self.load(missing))
+            if dtype:
+                df = df.astype(dtype)
+            codes = np.repeat(np.arange(len(self.registrations)),
+                              self.ends - self.starts)
+            sums = df.groupby(codes).sum()
+            for col in missing:
+                self.sums[(col, dtype)] = sums[col].array
+            self.grown()
+        return pd.DataFrame(
+            {col: self.sums[(col, dtype)] for col in columns},
+            pd.Index(self.registrations, name=KEY))
+
+
+class BuildingIndexes:
+    """
+    BuildingIndex of each dataset, built once per dataset hash
+    and kept while the total size of least recently used ones
+    is within `max_bytes`.
+
+    """
+
+    def __init__(self, max_bytes: int = BUILDINGS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.indexes = OrderedDict()
+
+    def get(self, file):
+        if not isinstance(file, Dataset):
+            return BuildingIndex(file)
+        index = self.indexes.pop(file.id, None) or BuildingIndex(file, self)
+        self.indexes[file.id] = index
+        self.evict()
+        return index
+
+    def evict(self):
+        total = sum(index.nbytes for index in self.indexes.values())
+        while total > self.max_bytes and len(self.indexes) > 1:
+            _, index = self.indexes.popitem(last=False)
+            total -= index.nbytes
@@ -0,0 +1,146 @@
+import os
+import time
+import tempfile
+from hashlib import blake2b
+from typing import Callable, Iterable, Optional, Union
+
+# server side files are only ever named by content_hash and written by us
+CACHE_DIR = os.environ.get(
+    'CACHE_DIR', os.path.join(tempfile.gettempdir(), 'housing-analytics'))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 1 << 30))
+
+
+def content_hash(*parts: Union[str, bytes, Iterable[str]]):
+    """
+    Hex digest of parts, where iterable parts are hashed line by line
+    e.g. a column of names, without joining them in memory.
+
+    """
+    digest = blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            for line in part:
+                digest.update(f'{line}\n'.encode())
+        # separate parts so that ('ab', 'c') ≠ ('a', 'bc')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def file_hash(file, block_size: int = 1 << 20):
+    """
+    content_hash of an uploaded file, read in blocks and rewound.
+
+    """
+    digest = blake2b(digest_size=20)
+    for block in iter(lambda: file.read(block_size), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Directory of files named by key, evicting least recently used files
+    once their total size exceeds `max_bytes` or unused for `max_age`.
+
+    Keys must be content_hash digests, never user input, hence
+    no path of the cache can be steered outside `directory`.
+
+    Parameters
+    ----------
+    directory  : created if missing.
+    max_bytes  : total size of cached files to keep, 0 to keep none,
+        None to keep all.
+    suffix     : file extension of cached files.
+    max_age    : seconds since last use to keep files for, None for ever.
+
+    """
+
+    def __init__(self, directory: str,
+                 max_bytes: Optional[int] = CACHE_MAX_BYTES,
+                 suffix: str = '', max_age: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str):
+        if not key.isalnum():
+            raise ValueError(f'invalid cache key: {key!r}')
+        return os.path.join(self.directory, f'{key}{self.suffix}')
+
+    def read(self, key: str, reader: Callable):
+        """
+        reader(path) of the cached file, None on a miss.
+
+        """
+        path = self.path(key)
+        try:
+            # last access time, which may not be tracked by the filesystem
+            os.utime(path)
+            return reader(path)
+        except FileNotFoundError:
+            # missing or evicted in the meantime
+            return None
+
+    def write(self, key: str, writer: Callable):
+        """
+        writer(file) to a temporary file, atomically moved in place
+        so that readers never see a partially written file.
+
+        """
+        path = self.path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                writer(file)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def move(self, key: str, path: str):
+        """
+        Move the file at `path`, on the same filesystem, in place.
+
+        """
+        os.replace(path, self.path(key))
+        self.evict()
+
+    def files(self):
+        """
+        (last use, size, key, path) of cached files, least recently used first.
+
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            key = entry.name[:len(entry.name) - len(self.suffix)]
+            if entry.is_file() and entry.name.endswith(self.suffix) \
+                    and key.isalnum():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, key, entry.path))
+        return sorted(files)
+
+    def remove(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        files = self.files()
+        total = sum(size for _, size, _, _ in files)
+        expired = time.time() - self.max_age \
+            if self.max_age is not None else float('-inf')
+        for last_use, size, key, _ in files:
+            if (self.max_bytes is None or total <= self.max_bytes) \
+                    and last_use >= expired:
+                continue
+            self.remove(key)
+            total -= size
@@ -1,44 +1,77 @@
+import zlib
+import zipfile
+import tempfile
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import xlsxwriter
 from os import path
 from enum import Enum
 from io import BytesIO
-from flask import send_file
+from flask import send_file, request, Response
+from . import datasets
+from .datasets import Dataset
+
+
+# rows encoded at once when streaming CSV
+CSV_CHUNK_SIZE = 10_000
+GZIP_LEVEL = 5
+EXCEL_MAX_ROWS = 1_048_576
 
 
 class ExportType(Enum):
     EXCEL = 'xlsx'
     CSV = 'csv'
+    ZIP = 'zip'
 
     def __str__(self):
         return self.value
 
 
-def lowercase(df):
-    def lower(col):
-        if col.dtype == 'string':
-            return col.str.lower()
-        elif col.dtype == 'object':
+def lower(col):
+    """
+    Lowercase strings of a column, leaving other values as they are.
+    Object columns of ASCII strings are lowercased by Arrow at once,
+    converting equal strings back to a single python string.
+
+    """
+    if col.dtype == 'string':
+        return col.str.lower()
+    elif col.dtype == 'object':
+        try:
+            array = pa.array(col, from_pandas=True)
+        except pa.ArrowException:
+            array = None
+        # strings besides other objects or beyond ASCII are lowercased by python
+        if array is None or not pa.types.is_string(array.type) or \
+                pc.all(pc.string_is_ascii(array)).as_py() is False:
             return col.map(
                 lambda s:
                     s.lower() if isinstance(s, str) else s, na_action='ignore')
-        return col
+        values = pc.ascii_lower(array).to_pandas().to_numpy()
+        if array.null_count:
+            na = array.is_null().to_numpy(zero_copy_only=False)
+            values[na] = col.to_numpy()[na]
+        return pd.Series(values, col.index, name=col.name)
+    return col
+
+
+def lowercase(df):
     return df.apply(lower)
 
 
-def read_csv(file, default_dtype=None, dtype=None, lower_case=False, **kwargs):
-    if default_dtype:
-        if not isinstance(dtype, dict):
-            raise Exception(
-                'dtype must be a dict to parse remaining columns as default_dtype')
-        header = pd.read_csv(file, nrows=0)
-        file.seek(0)
-        dtype = {
-            **dict.fromkeys(
-                header.columns.difference(dtype.keys()), default_dtype),
-            **dtype,
-        }
+def read_csv(file, dtype=None, lower_case=False, **kwargs):
+    """
+    pandas.read_csv of an uploaded file or a registered Dataset,
+    parsed by pyarrow with datasets.DTYPES for the columns they declare
+    and strings backed by arrow.
 
-    df = pd.read_csv(file, dtype=dtype, **kwargs)
+    """
+    if isinstance(file, Dataset):
+        df = file.read(dtype=dtype, **kwargs)
+    else:
+        df = datasets.read(file, dtype=dtype, **kwargs)
 
     if lower_case:
         df = lowercase(df)
@@ -55,36 +88,285 @@ def filename(file, default=''):
         getattr(file, 'filename') or default))[0]
 
 
+def excel_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+def excel_values(values):
+    """
+    Python scalars of values as written by df.to_excel:
+    missing values are blank, infinities 'inf' and other objects strings.
+
+    """
+    values = pd.Series(values)
+    na = values.isna().to_numpy()
+    infinite = np.zeros(len(values), bool)
+    if values.dtype.kind == 'f':
+        infinite = np.isinf(values.to_numpy())
+    values = values.astype(object).to_numpy()
+    if values.dtype.kind == 'O' and len(values):
+        values = np.array(list(map(excel_value, values.tolist())), object)
+    values[infinite] = np.where(values[infinite] > 0, 'inf', '-inf')
+    values[na] = None
+    return values.tolist()
+
+
+def excel_fallback(df):
+    """
+    Whether df is written by df.to_excel instead of write_sheet.
+
+    """
+    return df.index.nlevels > 1 or any(
+        dtype.kind in 'mM' for dtype in (df.index.dtype, *df.dtypes))
+
+
+def write_sheet(workbook, sheet_name, df):
+    """
+    df as sheet `sheet_name` of an xlsxwriter workbook,
+    in the layout of df.to_excel.
+
+    """
+    nlevels = df.columns.nlevels
+    # MultiIndex columns push the index name below the header
+    start = nlevels + 1 if nlevels > 1 else 1
+    if start + len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(
+            f'{len(df)} rows exceed the Excel row limit of {EXCEL_MAX_ROWS}')
+
+    sheet = workbook.add_worksheet(sheet_name)
+    header = workbook.add_format({
+        'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+    columns = df.columns
+    if nlevels > 1:
+        codes = np.array(columns.codes)
+        for level, name in enumerate(columns.names):
+            sheet.write(level, 0, excel_values([name])[0] or '', header)
+            labels = excel_values(columns.get_level_values(level))
+            # merge consecutive labels sharing all levels upto this one
+            starts = np.flatnonzero(np.r_[True, np.any(
+                codes[:level + 1, 1:] != codes[:level + 1, :-1], axis=0)])
+            if level == nlevels - 1:
+                starts = np.arange(len(columns))
+            ends = np.r_[starts[1:], len(columns)] - 1
+            for first, last in zip(starts.tolist(), ends.tolist()):
+                label = '' if labels[first] is None else labels[first]
+                if first == last:
+                    sheet.write(level, first + 1, label, header)
+                else:
+                    sheet.merge_range(
+                        level, first + 1, level, last + 1, label, header)
+        if df.index.name:
+            sheet.write(nlevels, 0, df.index.name, header)
+    else:
+        if df.index.name:
+            sheet.write(0, 0, df.index.name, header)
+        for i, label in enumerate(excel_values(columns)):
+            sheet.write(0, i + 1, '' if label is None else label, header)
+
+    index = excel_values(df.index)
+    values = [excel_values(df.iloc[:, i]) for i in range(len(columns))]
+    for row, (label, *cells) in enumerate(zip(index, *values), start):
+        sheet.write(row, 0, '' if label is None else label, header)
+        sheet.write_row(row, 1, cells)
+
+
+def write_workbook(sheets: dict, buffer):
+    """
+    Dataframes by sheet name as a workbook, each written as by write_excel.
+    Falls back to df.to_excel for all sheets if any needs it.
+
+    """
+    if any(map(excel_fallback, sheets.values())):
+        with pd.ExcelWriter(buffer) as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name)
+        return
+
+    workbook = xlsxwriter.Workbook(buffer, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    try:
+        for name, df in sheets.items():
+            write_sheet(workbook, name, df)
+    finally:
+        workbook.close()
+
+
+def write_excel(df, buffer):
+    """
+    df.to_excel in the same layout and header style, written row by row
+    with xlsxwriter in constant memory mode, i.e. without keeping cells
+    of previous rows, far faster than through openpyxl.
+    Strings are never converted to formulas or urls.
+    Falls back to df.to_excel for hierarchical rows or datetimes.
+
+    """
+    if excel_fallback(df):
+        df.to_excel(buffer)
+        return
+    write_workbook({'Sheet1': df}, buffer)
+
+
+def write_zip(frames: dict, buffer):
+    """
+    Dataframes by name as a zip of name.csv files.
+
+    """
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, df in frames.items():
+            with archive.open(f'{name}.csv', 'w') as file:
+                for chunk in stream_csv(df):
+                    file.write(chunk)
+
+
 def bufferize(df, export_type: ExportType = ExportType.CSV):
     buffer = BytesIO()
     if export_type == ExportType.EXCEL:
-        df.to_excel(buffer, encoding='utf-8')
+        write_excel(df, buffer)
     else:
         df.to_csv(buffer, index=False, encoding='utf-8')
     buffer.seek(0)
     return buffer
 
 
+def stream_csv(df, chunksize: int = CSV_CHUNK_SIZE, gzip: bool = False):
+    """
+    Yield df as utf-8 CSV, encoded `chunksize` rows at a time
+    and gzipped on the fly if `gzip`.
+
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) \
+        if gzip else None
+    # atleast one chunk for the header
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start:start + chunksize].to_csv(
+            index=False, header=not start).encode('utf-8')
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
 mimetype = {
     ExportType.CSV: 'text/csv',
+    ExportType.ZIP: 'application/zip',
     ExportType.EXCEL: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 }
 
 
 def export(df: pd.DataFrame, filename: str,
-           export_type: ExportType = ExportType.CSV):
+           export_type: ExportType = ExportType.CSV, gzip: bool = True):
+    """
+    Download response of df, where CSV is streamed in chunks
+    and gzipped if `gzip` and accepted by the client.
+
+    """
+    download_name = f'{filename}.{export_type}'
+    if export_type == ExportType.CSV:
+        gzip = gzip and 'gzip' in request.accept_encodings
+        response = Response(stream_csv(df, gzip=gzip),
+                            mimetype=mimetype[export_type])
+        response.headers.set('Content-Disposition', 'attachment',
+                             filename=download_name)
+        if gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+        return response
+
     return send_file(bufferize(df, export_type), mimetype[export_type],
-                     download_name=f'{filename}.{export_type}',
+                     download_name=download_name,
                      as_attachment=True)
 
 
+def export_sheets(frames: dict, filename: str,
+                  export_type: ExportType = ExportType.EXCEL):
+    """
+    Download response of dataframes by name, as sheets of a workbook
+    or CSV files of a zip, written to a temporary file rather than
+    memory and streamed from it.
+
+    """
+    buffer = tempfile.TemporaryFile()
+    try:
+        if export_type == ExportType.EXCEL:
+            write_workbook(frames, buffer)
+        else:
+            write_zip(frames, buffer)
+    except BaseException:
+        buffer.close()
+        raise
+    size = buffer.tell()
+    buffer.seek(0)
+    response = send_file(buffer, mimetype[export_type],
+                         download_name=f'{filename}.{export_type}',
+                         as_attachment=True)
+    response.content_length = size
+    return response
+
+
 def hash_cols(df):
-    df = df.astype('string').fillna('')
-    cols = df.columns
-    combined = df[cols[0]]
-    for col in cols[1:]:
-        combined += df[col]
-    return combined
+    """
+    64 bit hash of each row, of integer columns by value and others
+    as strings, missing values hashed as empty strings.
+    Columns are hashed separately and combined, hence unlike their
+    concatenation 'ab', 'c' and 'a', 'bc' differ, while distinct rows collide
+    with a chance of about rows**2 / 2**65, i.e. 1 in 30 million for a million.
+
+    """
+    empty = pd.util.hash_array(np.array([''], object))[0]
+    hashes = {}
+    for i, (_, col) in enumerate(df.items()):
+        if pd.api.types.is_integer_dtype(col.dtype):
+            values = col.to_numpy('int64', na_value=0)
+        elif col.dtype == 'object':
+            values = col.to_numpy()
+        else:
+            values = col.astype('string').to_numpy(object, na_value='')
+        try:
+            hashed = pd.util.hash_array(values)
+        except TypeError:
+            # objects besides strings
+            hashed = pd.util.hash_array(
+                col.astype('string').to_numpy(object, na_value=''))
+        hashed[col.isna().to_numpy()] = empty
+        hashes[i] = hashed
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(hashes, df.index), index=False)
+
+
+def join_values(groups, col, ngroups):
+    """
+    ' | ' joined distinct lowercase values of col within each group
+    in sorted order, empty for groups of missing values only.
+
+    """
+    na = col.isna().to_numpy()
+    codes, uniques = pd.factorize(
+        col[~na].astype(str).str.lower(), sort=True)
+    size = max(len(uniques), 1)
+    # distinct (group, value) pairs sorted by group then value
+    pairs = np.unique(groups[~na] * size + codes)
+    pair_groups = pairs // size
+    values = np.asarray(uniques, object).take(pairs % size)
+    starts = np.flatnonzero(np.diff(pair_groups, prepend=-1))
+    ends = np.r_[starts[1:], len(pairs)]
+
+    joined = np.full(ngroups, '', object)
+    joined[pair_groups[starts]] = [
+        ' | '.join(values[start:end]) for start, end in zip(
+            starts.tolist(), ends.tolist())]
+    if isinstance(col.dtype, pd.StringDtype):
+        return pd.array(joined, col.dtype)
+    return joined
 
 
 def dedup(df, index):
@@ -92,15 +374,21 @@ def dedup(df, index):
     concat duplicate column values when grouped by index
 
     """
-    # split -> str groupby smaller subset -> merge back for performance
+    # split -> groupby smaller subset -> merge back for performance
     duplicated = df.duplicated(subset=index, keep=False)
     dupes = df[duplicated]
     if dupes.empty:
         return df
-    nodupes = dupes.groupby(index, dropna=False).agg(
-        lambda x: ' | '.join(
-            x.dropna().astype(str).str.lower().drop_duplicates().sort_values()
-        )).reset_index()
+    groups = dupes.groupby(index, dropna=False).ngroup().to_numpy()
+    ngroups = groups.max() + 1
+    # first row of each group in sorted order of groups
+    order = np.argsort(groups, kind='stable')
+    firsts = order[np.r_[True, np.diff(groups[order]) != 0]]
+
+    nodupes = dupes[index].iloc[firsts].reset_index(drop=True)
+    for col in dupes.columns:
+        if col not in index:
+            nodupes[col] = join_values(groups, dupes[col], ngroups)
     return pd.concat([df[~duplicated], nodupes])
 
 
@@ -0,0 +1,350 @@
+import os
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+from typing import Optional
+from .cache import DiskCache, content_hash, file_hash
+
+DATASETS_MAX_BYTES = int(os.environ.get('DATASETS_MAX_BYTES', 4 << 30))
+# seconds, a month since last use by default
+DATASETS_MAX_AGE = float(os.environ.get('DATASETS_MAX_AGE', 30 * 24 * 3600))
+
+# dtypes of the columns of NYC Registration Contacts and Buildings Subject
+# to HPD Jurisdiction files, parsed as such wherever they're read rather than
+# inferred, e.g. zips and house numbers as strings keeping leading zeros
+DTYPES = {
+    'RegistrationContactID': 'UInt32',
+    'RegistrationID': 'UInt32',
+    'Type': 'string',
+    'ContactDescription': 'string',
+    'CorporationName': 'string',
+    'Title': 'string',
+    'FirstName': 'string',
+    'MiddleInitial': 'string',
+    'LastName': 'string',
+    'BusinessHouseNumber': 'string',
+    'BusinessStreetName': 'string',
+    'BusinessApartment': 'string',
+    'BusinessCity': 'string',
+    'BusinessState': 'string',
+    'BusinessZip': 'string',
+    'BuildingID': 'UInt32',
+    'BoroID': 'UInt32',
+    'Boro': 'string',
+    'HouseNumber': 'string',
+    'LowHouseNumber': 'string',
+    'HighHouseNumber': 'string',
+    'StreetName': 'string',
+    'StreetCode': 'string',
+    'Zip': 'string',
+    'Block': 'UInt32',
+    'Lot': 'UInt32',
+    'BIN': 'UInt32',
+    'CommunityBoard': 'UInt32',
+    'CensusTract': 'string',
+    'ManagementProgram': 'string',
+    'DoBBuildingClassID': 'UInt32',
+    'DoBBuildingClass': 'string',
+    'LegalStories': 'UInt32',
+    'LegalClassA': 'UInt32',
+    'LegalClassB': 'UInt32',
+    'LifeCycle': 'string',
+    'RecordStatusID': 'UInt32',
+    'RecordStatus': 'string',
+}
+ARROW_TYPES = {'UInt32': pa.uint32(), 'string': pa.string()}
+# dtypes of arrow types as read, strings backed by arrow
+PANDAS_DTYPES = {
+    pa.uint32(): pd.UInt32Dtype(),
+    pa.string(): pd.StringDtype('pyarrow'),
+    pa.large_string(): pd.StringDtype('pyarrow'),
+}
+# missing values as pandas.read_csv parses them
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null']
+# bytes of CSV parsed at once, across threads
+BLOCK_SIZE = 16 << 20
+# part of dataset ids, changed whenever converted datasets' dtypes change
+VERSION = '2'
+# rows per chunk when converting CSV files with undeclared columns
+CHUNK_SIZE = 100_000
+
+
+def unify(dtypes):
+    """
+    dtype of a whole column given the dtypes inferred for each of its chunks,
+    as pandas would infer it, except for mixed columns parsed as strings.
+
+    """
+    dtypes = set(map(str, dtypes))
+    if len(dtypes) == 1 and 'object' not in dtypes:
+        return dtypes.pop()
+    if dtypes <= {'int64', 'float64'}:
+        return 'float64'
+    return 'str'
+
+
+def open_csv(file, usecols=None):
+    """
+    Streaming reader of CSV file by pyarrow, parsing DTYPES columns
+    as declared, other columns as strings, missing values as pandas would
+    and only `usecols`. Other columns aren't inferred since pyarrow would
+    infer them from the first block only and fail on later ones.
+
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    header = pd.read_csv(file, nrows=0).columns
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    column_types = dict.fromkeys(header, pa.string())
+    column_types.update(
+        (col, ARROW_TYPES[t]) for col, t in DTYPES.items())
+    return csv.open_csv(
+        file, csv.ReadOptions(block_size=BLOCK_SIZE),
+        csv.ParseOptions(newlines_in_values=True),
+        csv.ConvertOptions(
+            column_types=column_types,
+            null_values=NA_VALUES, strings_can_be_null=True,
+            include_columns=usecols))
+
+
+def to_frame(table, dtype=None):
+    """
+    Dataframe of an arrow table or batch, strings backed by arrow,
+    with `dtype` for columns that aren't of it already.
+
+    """
+    df = table.to_pandas(types_mapper=PANDAS_DTYPES.get)
+    if isinstance(dtype, dict):
+        dtype = {col: t for col, t in dtype.items()
+                 if col in df and df[col].dtype != t}
+    elif dtype is not None and all(t == dtype for t in df.dtypes):
+        dtype = None
+    return df.astype(dtype) if dtype else df
+
+
+def conform(df):
+    """
+    Columns of DTYPES of df cast to them in place, e.g. of snapshots
+    saved before they were declared, whole floats as integers first.
+
+    """
+    for col, dtype in DTYPES.items():
+        if col in df and df[col].dtype != dtype:
+            values = df[col]
+            if values.dtype.kind == 'f':
+                values = values.astype('Int64')
+            df[col] = values.astype(PANDAS_DTYPES[ARROW_TYPES[dtype]])
+    return df
+
+
+def read(file, usecols=None, dtype=None, chunksize: Optional[int] = None):
+    """
+    Dataframe of CSV file like pandas.read_csv, parsed by pyarrow as
+    open_csv does, or an iterator of dataframes of atmost `chunksize` rows.
+    Unlike pandas, `usecols` are in their given order rather than the file's,
+    and columns not of DTYPES are strings unless of `dtype`.
+
+    """
+    if usecols is not None:
+        usecols = list(usecols)
+    try:
+        reader = open_csv(file, usecols)
+        if chunksize is None:
+            return to_frame(reader.read_all(), dtype)
+    except pa.ArrowInvalid as error:
+        raise ValueError(str(error)) from None
+
+    def chunks():
+        try:
+            for batch in reader:
+                for start in range(0, max(batch.num_rows, 1), chunksize):
+                    yield to_frame(batch.slice(start, chunksize), dtype)
+        except pa.ArrowInvalid as error:
+            raise ValueError(str(error)) from None
+    return chunks()
+
+
+def convert(file, output, filename: str = '', chunksize: int = CHUNK_SIZE):
+    """
+    Convert CSV file to parquet, streamed through pyarrow in a single pass
+    when all its columns are of DTYPES, otherwise in chunks through pandas
+    with dtypes inferred over all chunks for the remaining columns.
+
+    """
+    try:
+        reader = open_csv(file)
+        if set(reader.schema.names) <= DTYPES.keys():
+            schema = reader.schema.with_metadata({
+                b'filename': filename.encode()})
+            with pq.ParquetWriter(output, schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+            return
+    except pa.ArrowInvalid as error:
+        raise ValueError(f'{filename}: {error}') from None
+
+    file.seek(0)
+    header = pd.read_csv(file, nrows=0).columns
+    file.seek(0)
+    dtype = {col: DTYPES[col] for col in header if col in DTYPES}
+
+    inferred = {col: [] for col in header.difference(dtype.keys())}
+    for chunk in pd.read_csv(file, dtype=dtype, chunksize=chunksize):
+        for col, dtypes in inferred.items():
+            dtypes.append(chunk[col].dtype)
+    file.seek(0)
+    dtype.update((col, unify(dtypes)) for col, dtypes in inferred.items())
+
+    writer = None
+    for chunk in pd.read_csv(file, dtype=dtype, chunksize=chunksize):
+        if writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            # object columns may be all null in the first chunk
+            for i, name in enumerate(schema.names):
+                if dtype[name] == 'str':
+                    schema = schema.set(i, pa.field(name, pa.string()))
+            schema = schema.with_metadata({
+                **schema.metadata, b'filename': filename.encode()})
+            writer = pq.ParquetWriter(output, schema)
+        writer.write_table(pa.Table.from_pandas(
+            chunk, schema=schema, preserve_index=False))
+    if writer is None:
+        file.seek(0)
+        pq.write_table(pa.Table.from_pandas(
+            pd.read_csv(file, dtype=dtype, nrows=0), preserve_index=False)
+            .replace_schema_metadata({b'filename': filename.encode()}),
+            output)
+    else:
+        writer.close()
+
+
+class Dataset:
+    """
+    Registered CSV file, read by common.read_csv like the file itself,
+    strings backed by arrow.
+
+    """
+
+    def __init__(self, id: str, path: str):
+        self.id = id
+        self.path = path
+        # an open file remains readable once evicted
+        self.file = pq.ParquetFile(path)
+        schema = self.file.schema_arrow
+        self.filename = schema.metadata.get(b'filename', b'').decode()
+        self.columns = schema.names
+        self.rows = self.file.metadata.num_rows
+
+    def __reduce__(self):
+        # reopened by path when pickled, e.g. for another process
+        return Dataset, (self.id, self.path)
+
+    def read(self, usecols=None, dtype=None, chunksize: Optional[int] = None):
+        """
+        Dataframe of `usecols` in file order, like pandas.read_csv,
+        or an iterator of dataframes of `chunksize` rows.
+
+        """
+        if usecols is not None:
+            missing = set(usecols).difference(self.columns)
+            if missing:
+                raise ValueError(
+                    f'Usecols do not match columns, '
+                    f'columns expected but not found: {sorted(missing)}')
+            usecols = [col for col in self.columns if col in usecols]
+        if isinstance(dtype, dict):
+            dtype = {col: t for col, t in dtype.items()
+                     if col in (usecols or self.columns)}
+
+        if chunksize is None:
+            return to_frame(self.file.read(usecols), dtype)
+        return (to_frame(batch, dtype) for batch in
+                self.file.iter_batches(chunksize, columns=usecols))
+
+
+class DatasetStore:
+    """
+    Uploaded CSV files converted to parquet, keyed by a hash of their content,
+    hence uploading the same file again or referring to its id
+    skips parsing it.
+
+    Parameters
+    ----------
+    directory  : created if missing.
+    max_bytes  : total size of datasets to keep.
+    max_age    : seconds since last use to keep datasets for.
+
+    """
+
+    def __init__(self, directory: str,
+                 max_bytes: int = DATASETS_MAX_BYTES,
+                 max_age: Optional[float] = DATASETS_MAX_AGE):
+        self.cache = DiskCache(directory, max_bytes, '.parquet', max_age)
+
+    def register(self, file, chunksize: int = CHUNK_SIZE):
+        """
+        Dataset of an uploaded file, converted on first upload.
+        Refused if converted it exceeds max_bytes on its own,
+        since it would be evicted as soon as it's stored.
+
+        """
+        id = content_hash(file_hash(file), VERSION)
+        dataset = self.cache.read(id, lambda path: Dataset(id, path))
+        if dataset is None:
+            filename = getattr(file, 'filename', None) or ''
+            fd, path = tempfile.mkstemp(dir=self.cache.directory,
+                                        suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as output:
+                    convert(file, output, filename, chunksize)
+                size = os.path.getsize(path)
+                if self.cache.max_bytes is not None \
+                        and size > self.cache.max_bytes:
+                    raise ValueError(
+                        f'Dataset {filename} of {size} bytes exceeds '
+                        f'{self.cache.max_bytes} bytes of datasets kept')
+                self.cache.move(id, path)
+            except BaseException:
+                os.remove(path)
+                raise
+            dataset = self.get(id)
+        return dataset
+
+    def get(self, id: str):
+        dataset = self.cache.read(id, lambda path: Dataset(id, path)) \
+            if id and id.isalnum() else None
+        if dataset is None:
+            raise ValueError(f'Dataset {id} not found, upload its file again')
+        return dataset
+
+    def list(self, ids: list[str]):
+        """
+        Registered datasets of `ids`, e.g. those a client uploaded,
+        most recently used first. Unknown or evicted ids are skipped.
+
+        """
+        self.cache.evict()
+        ids = {id.strip() for id in ids}
+        datasets = []
+        for last_use, size, id, path in reversed(self.cache.files()):
+            if id not in ids:
+                continue
+            try:
+                dataset = Dataset(id, path)
+            except FileNotFoundError:
+                continue
+            datasets.append({
+                'id': id,
+                'filename': dataset.filename,
+                'rows': dataset.rows,
+                'columns': dataset.columns,
+                'bytes': size,
+                'last_used': last_use,
+            })
+        return datasets
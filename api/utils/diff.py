@@ -1,42 +1,75 @@
+import os
+import tempfile
+import numpy as np
 import pandas as pd
-from typing import Optional, Callable
+import pyarrow.parquet as pq
+from itertools import repeat
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Callable, Iterable
+from .progress import report
+from .snapshots import to_table, to_frame
+
+# rows per bucket of partitioned diffs, bounding their memory,
+# 0 to diff in memory, prepared in parallel and in key order
+DIFF_BUCKET_ROWS = int(os.environ.get('DIFF_BUCKET_ROWS', 0))
+# processes to diff buckets with, 1 to diff them in this process
+DIFF_WORKERS = int(os.environ.get('DIFF_WORKERS', 1))
+
+CHANGE_TYPES = ['added', 'removed', 'changed']
 
 
 def index_changes(odf, ndf):
+    """
+    ChangeType of each index value, in order of the new then
+    the removed old index, e.g. of hashes whose sorted order is arbitrary.
+
+    """
     index_name = ndf.index.name or 'index'
-    changes = pd.DataFrame(
-        ndf.index,
-        columns=[index_name]
-    ).merge(
-        pd.DataFrame(
-            odf.index,
-            columns=[index_name]),
-        on=index_name,
-        how='outer',
-        indicator=True)
+    in_old = ndf.index.isin(odf.index)
+    removed = odf.index[~odf.index.isin(ndf.index)]
 
-    changes = changes.rename(columns={'_merge': 'ChangeType'})
-    changes['ChangeType'] = changes['ChangeType'].map(
-        {'left_only': 'added', 'both': 'changed', 'right_only': 'removed'})
+    changes = pd.Series(
+        pd.Categorical(
+            np.r_[np.where(in_old, 'changed', 'added'),
+                  np.full(len(removed), 'removed')],
+            categories=CHANGE_TYPES),
+        index=ndf.index.append(removed).rename(index_name),
+        name='ChangeType')
 
-    return changes.set_index(index_name)
+    return changes.to_frame()
 
 
-def diff_frames(odf: pd.DataFrame, ndf: pd.DataFrame,
-                ignore_cols: tuple[str] = (),
-                show_atleast: tuple[str] = (),
-                removed_mask: Optional[Callable[[pd.DataFrame], pd.Series]] = None):
+def row_digests(df: pd.DataFrame, columns: Iterable[str],
+                rows: Optional[np.ndarray] = None):
     """
-    Compare dataframes with identical columns on index
+    64 bit hash of `columns` of each row, or those at positions `rows`,
+    equal for rows DataFrame.compare finds equal, barring collisions.
+    Strings hash unlike numbers, which hash_array would hash
+    as strings in mixed columns.
 
-    Parameters
-    ----------
-    odf          : old dataframe
-    ndf          : new dataframe
-    ignore_cols  : columns to ignore from comparison
-    show_atleast : show atleast these columns even when no change
-    removed_mask : accepts removed rows as dataframe and
-        retuns identically indexed boolean mask for rows to keep
+    """
+    hashes = {}
+    for i, col in enumerate(columns):
+        col = df[col] if rows is None else df[col].take(rows)
+        hashes[i] = pd.util.hash_pandas_object(col, index=False).to_numpy()
+        if col.dtype == 'object' and pd.api.types.infer_dtype(
+                col, skipna=True) not in ('string', 'empty'):
+            hashes[f'{i} strings'] = (col.map(type) == str).to_numpy()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(hashes), index=False).to_numpy()
+
+
+def diff_parts(odf: pd.DataFrame, ndf: pd.DataFrame,
+               ignore_cols: tuple[str] = (),
+               show_atleast: tuple[str] = (),
+               removed_mask: Optional[Callable] = None,
+               digests: bool = True):
+    """
+    Changed, added and removed rows of diff_frames, to be combined
+    by combine_parts along with those of other frames.
+    Changed rows hold ('new', 'old') values of their changed columns
+    and (col, '') values of all `show_atleast` columns.
 
     """
     cdf = index_changes(odf, ndf)
@@ -52,16 +85,35 @@ def diff_frames(odf: pd.DataFrame, ndf: pd.DataFrame,
     changed = cdf['ChangeType'] == 'changed'
     changed = changed.index[changed]
     subset = ndf.columns.difference(ignore_cols)
-    changed = odf.loc[changed, subset].compare(
-        ndf.loc[changed, subset]).convert_dtypes()
+    if digests and odf.index.is_unique and ndf.index.is_unique:
+        # compare only rows whose digests differ, mostly none of them
+        differ = row_digests(odf, subset, odf.index.get_indexer(changed)) \
+            != row_digests(ndf, subset, ndf.index.get_indexer(changed))
+        changed = changed[differ]
+    changed = odf.loc[changed, subset].compare(ndf.loc[changed, subset])
+    # self being old
+    changed.columns = changed.columns.set_levels(
+        changed.columns.levels[1].map({'self': 'old', 'other': 'new'}),
+        level=1)
 
-    changed.columns = changed.columns.set_levels(['new', 'old'], level=1)
+    for col in show_atleast:
+        changed[(col, '')] = ndf.loc[changed.index, col]
 
-    changed_cols = changed.columns.levels[0]
+    return changed, added, removed
 
-    for col in show_atleast:
-        if col not in changed_cols:
-            changed[col] = ndf.loc[changed.index, col]
+
+def combine_parts(parts: Iterable[tuple], show_atleast: tuple[str] = ()):
+    """
+    diff_frames of diff_parts of disjoint rows.
+
+    """
+    changed, added, removed = (pd.concat(frames) for frames in zip(*parts))
+
+    changed_cols = sorted({c for c, side in changed.columns if side})
+    compared = changed[[
+        (c, side) for c in changed_cols for side in ('new', 'old')]]
+    shown = changed[[(c, '') for c in show_atleast if c not in changed_cols]]
+    changed = pd.concat([compared.convert_dtypes(), shown], axis=1)
 
     # convert to multiindex for concatenation
     added.columns = added.columns.map(
@@ -72,6 +124,120 @@ def diff_frames(odf: pd.DataFrame, ndf: pd.DataFrame,
     combined = pd.concat([changed, added, removed]).dropna(how='all', axis=1)
     combined.columns = combined.columns.remove_unused_levels()
 
-    combined['ChangeType'] = cdf.loc[combined.index, 'ChangeType']
+    combined['ChangeType'] = pd.Categorical(
+        np.repeat(['changed', 'added', 'removed'],
+                  [len(changed), len(added), len(removed)]),
+        categories=CHANGE_TYPES)
 
     return combined
+
+
+def diff_frames(odf: pd.DataFrame, ndf: pd.DataFrame,
+                ignore_cols: tuple[str] = (),
+                show_atleast: tuple[str] = (),
+                removed_mask: Optional[Callable[[pd.DataFrame], pd.Series]] = None,
+                digests: bool = True):
+    """
+    Compare dataframes with identical columns on index
+
+    Parameters
+    ----------
+    odf          : old dataframe
+    ndf          : new dataframe
+    ignore_cols  : columns to ignore from comparison
+    show_atleast : show atleast these columns even when no change
+    removed_mask : accepts removed rows as dataframe and
+        retuns identically indexed boolean mask for rows to keep
+    digests      : compare only rows whose row_digests differ,
+        instead of all rows in both
+
+    """
+    return combine_parts(
+        [diff_parts(odf, ndf, ignore_cols, show_atleast, removed_mask,
+                    digests)],
+        show_atleast)
+
+
+def partition(chunks: Iterable[pd.DataFrame], buckets: int,
+              directory: str, name: str, key: Callable):
+    """
+    Write rows of each chunk to parquet files of the bucket
+    key(chunk) % `buckets`, returning the files of each bucket.
+
+    """
+    paths = [[] for _ in range(buckets)]
+    for i, chunk in enumerate(chunks):
+        ids = np.asarray(key(chunk), np.uint64) % np.uint64(buckets)
+        order = np.argsort(ids, kind='stable')
+        bounds = np.searchsorted(ids[order], np.arange(buckets + 1))
+        for bucket, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            path = os.path.join(directory, f'{name}-{bucket}-{i}.parquet')
+            pq.write_table(to_table(chunk.iloc[order[start:end]]), path)
+            paths[bucket].append(path)
+    return paths
+
+
+def read_bucket(paths: list[str], prepare: Optional[Callable]):
+    df = pd.concat([to_frame(pq.read_table(path)) for path in paths])
+    for path in paths:
+        os.remove(path)
+    return prepare(df) if prepare else df
+
+
+def diff_bucket(old_paths, new_paths, prepare_old, prepare_new, *args):
+    return diff_parts(read_bucket(old_paths, prepare_old),
+                      read_bucket(new_paths, prepare_new), *args)
+
+
+def diff_partitioned(old_chunks: Iterable[pd.DataFrame],
+                     new_chunks: Iterable[pd.DataFrame],
+                     key: Callable, buckets: int,
+                     prepare_old: Optional[Callable] = None,
+                     prepare_new: Optional[Callable] = None,
+                     ignore_cols: tuple[str] = (),
+                     show_atleast: tuple[str] = (),
+                     removed_mask: Optional[Callable] = None,
+                     workers: int = DIFF_WORKERS,
+                     directory: Optional[str] = None):
+    """
+    diff_frames of frames larger than memory, read in chunks:
+    rows are partitioned by their key into `buckets` pairs of
+    temporary files, each pair read and compared on its own,
+    hence peak memory is that of `workers` bucket pairs and the result.
+    Rows sharing an index must share a key, e.g. a hash of the index.
+
+    Parameters
+    ----------
+    old_chunks   : old dataframe in chunks
+    new_chunks   : new dataframe in chunks
+    key          : accepts a chunk and returns uint64 keys of its rows
+    buckets      : number of buckets
+    prepare_old  : accepts old rows of a bucket, e.g. to index them,
+        must be picklable for workers, like module level functions
+    prepare_new  : likewise for new rows of a bucket
+    workers      : processes to compare buckets with, 1 for this one
+    directory    : of temporary files, defaults to the system's
+
+    See diff_frames for the remaining parameters.
+
+    """
+    args = ignore_cols, show_atleast, removed_mask
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        old = partition(old_chunks, buckets, directory, 'old', key)
+        new = partition(new_chunks, buckets, directory, 'new', key)
+
+        parts = []
+        executor = ProcessPoolExecutor(
+            workers, mp_context=get_context('spawn')) if workers > 1 else None
+        try:
+            results = (executor.map if executor else map)(
+                diff_bucket, old, new,
+                repeat(prepare_old), repeat(prepare_new), *map(repeat, args))
+            for part in results:
+                parts.append(part)
+                report('diff', len(parts), buckets)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+    return combine_parts(parts, show_atleast)
@@ -1,9 +1,39 @@
+import os
 import re
+import numpy as np
+import multiprocessing
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from typing import Callable
 from rapidfuzz import fuzz, process
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from itertools import tee, chain, filterfalse
 from typing import Optional
+from .cache import DiskCache, content_hash
+from .progress import report
+from .common import lower
+
+
+# larger batches waste more scores on names claimed earlier in the batch
+BATCH_SIZE = 256
+# bound weighted_cdist matrices to ~64MB
+MAX_CELLS = 1 << 23
+# ratio of the longest to the shortest name of a batch's length bucket
+LENGTH_BUCKET = 1.25
+# fraction of a batch's pairs within its length buckets beyond which
+# the batch is scored as one block, faster to score per pair
+BLOCKING_MAX_PAIRS = 0.75
+# lowest similarity answered by cached neighbors,
+# below it token_set_ratio scores nearly every pair
+NEIGHBORS_FLOOR = 85
+# scorers of names and their weights, by fuzzyfy and NameIndex
+TOKEN_SET_WEIGHT = 0.725
+WEIGHTS = (1 - TOKEN_SET_WEIGHT, TOKEN_SET_WEIGHT)
+SCORERS = (fuzz.ratio, fuzz.token_set_ratio)
+# processed names memoized per set of ignore_keywords
+PROCESSED_NAMES = 1 << 18
 
 
 class IteratorWithItems:
@@ -34,21 +64,97 @@ def normalize(values):
     return tuple(v / total for v in values)
 
 
-def processor(ignore_keywords=None):
+class NameProcessor:
+    """
+    Names lowercased, stripped of `ignore_keywords` and non-word chars
+    but -.&, their words sorted, '#' if none remain.
+    Processed names are memoized, up to `max_names` of the latest ones.
+
+    ASCII names are processed at once by Arrow's regex engine, whose
+    \\w, unlike python's, only matches ASCII, hence others by python's.
+
+    """
     EMPTY_STRING_GROUP = '#'
-    ignore_regex = r'(?![\-.&])\W'
-    if ignore_keywords:
-        ignore_keywords = sorted(ignore_keywords, key=len, reverse=True)
-        ignore_keywords = '|'.join(ignore_keywords).lower()
-        ignore_regex = f'{ignore_keywords}|{ignore_regex}'
-    ignore_regex = re.compile(ignore_regex)
 
-    def process(s: str):
-        processed = ignore_regex.sub(' ', s.lower())
-        processed = ' '.join(sorted(processed.split()))
-        return processed if processed else EMPTY_STRING_GROUP
+    def __init__(self, ignore_keywords: tuple[str] = (),
+                 max_names: int = PROCESSED_NAMES):
+        pattern = '[^\\w\\-.&]'
+        if ignore_keywords:
+            ignore_keywords = sorted(ignore_keywords, key=len, reverse=True)
+            pattern = f'{"|".join(ignore_keywords)}|{pattern}'
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.max_names = max_names
+        self.processed = {}
+
+    def __call__(self, s: str):
+        s = s.lower()
+        return self.processed.get(s) or self.join(self.regex.sub(' ', s))
+
+    def join(self, s: str):
+        return ' '.join(sorted(s.split())) or self.EMPTY_STRING_GROUP
+
+    def substitute(self, names: list[str]):
+        array = pa.array(names, pa.string())
+        ascii = pc.string_is_ascii(array).to_numpy(zero_copy_only=False)
+        try:
+            substituted = iter(pc.replace_substring_regex(
+                array.filter(ascii), self.pattern, ' ').to_pylist())
+        except pa.ArrowInvalid:
+            # python only regex syntax in ignore_keywords
+            return [self.regex.sub(' ', s) for s in names]
+        if ascii.all():
+            return list(substituted)
+        return [next(substituted) if is_ascii else self.regex.sub(' ', s)
+                for s, is_ascii in zip(names, ascii)]
+
+    def process(self, names: list[str]):
+        """
+        Processed lowercase `names`.
+
+        """
+        processed = self.processed
+        missing = [s for s in dict.fromkeys(names) if s not in processed]
+        new = {}
+        if missing:
+            empty = self.EMPTY_STRING_GROUP
+            new = dict(zip(missing, [
+                ' '.join(sorted(s.split())) or empty
+                for s in self.substitute(missing)]))
+            processed.update(new)
+            excess = len(processed) - self.max_names
+            if excess > 0:
+                for s in list(processed)[:excess]:
+                    processed.pop(s, None)
+        return [new.get(s) or processed.get(s) or self.join(
+            self.regex.sub(' ', s)) for s in names]
+
+
+@lru_cache(maxsize=16)
+def name_processor(ignore_keywords: tuple[str]):
+    return NameProcessor(ignore_keywords)
+
+
+def processor(ignore_keywords=None):
+    """
+    NameProcessor of `ignore_keywords`, shared by calls
+    with the same set of keywords.
+
+    """
+    return name_processor(
+        tuple(sorted({k.lower() for k in ignore_keywords or ()})))
+
+
+def process_names(names: pd.Series, ignore_keywords=None):
+    """
+    processor(ignore_keywords) of each name, each distinct name
+    lowercased and processed once, missing ones left None.
 
-    return process
+    """
+    codes, uniques = pd.factorize(names)
+    processed = processor(ignore_keywords).process(
+        list(lower(pd.Series(uniques, dtype=object))))
+    return np.array(processed + [None], object)[codes]
 
 
 def weighted_extract(query, choices, processor=None,
@@ -138,8 +244,439 @@ def weighted_extract(query, choices, processor=None,
     return chain(*shorted, matches)
 
 
+def min_cutoffs(score_cutoff, weights: tuple[float]):
+    """
+    Minimum score each scorer must reach for the weighted score
+    to reach score_cutoff, along with the maximum score of the scorers after it.
+
+    """
+    for i, weight in enumerate(weights):
+        min_cutoff = (score_cutoff - (100 * sum_except(weights, i))) / weight
+        yield max(min_cutoff, 0), 100 * sum(weights[i + 1:])
+
+
+def weighted_cdist(queries, choices, score_cutoff=0,
+                   weights: Optional[tuple[float]] = None,
+                   scorers: tuple[Callable] = (
+                       fuzz.ratio, fuzz.token_set_ratio),
+                   workers: int = 1, sparse: bool = False):
+    """
+    Batched weighted_extract: score all queries against all choices
+    with rapidfuzz.process.cdist, pruning pairs that can no longer
+    reach score_cutoff before moving on to the next scorer,
+    which then only scores the remaining pairs with rapidfuzz.process.cpdist.
+
+    Parameters
+    ----------
+    weights         : relative weights to compute average score of all scorers.
+        defaults to equal weightage for each scorer.
+    workers         : number of threads, -1 for all cores.
+    sparse          : whether to return only the pairs atleast score_cutoff.
+
+    Returns
+    -------
+    len(queries) x len(choices) matrix of weighted scores,
+    set to 0 for pairs below score_cutoff.
+    If sparse, (query positions, choice positions, weighted scores) of pairs
+    atleast score_cutoff, ordered by query then choice.
+
+    """
+    if weights is None:
+        weights = map(lambda _: 1, scorers)
+    weights = normalize(weights)
+
+    queries = np.asarray(queries, object)
+    choices = np.asarray(choices, object)
+    stages = zip(scorers, weights, min_cutoffs(score_cutoff, weights))
+    for i, (scorer, weight, (min_cutoff, max_remaining_score)) in \
+            enumerate(stages):
+        if i == 0:
+            ratios = process.cdist(
+                queries, choices, scorer=scorer, score_cutoff=min_cutoff,
+                dtype=np.float64, workers=workers)
+            rows, cols = np.nonzero(ratios >= min_cutoff)
+            ratios = ratios[rows, cols]
+            scores = np.zeros(len(rows))
+        else:
+            ratios = process.cpdist(
+                queries[rows], choices[cols], scorer=scorer,
+                score_cutoff=min_cutoff, dtype=np.float64, workers=workers)
+            passed = ratios >= min_cutoff
+            rows, cols, ratios, scores = \
+                rows[passed], cols[passed], ratios[passed], scores[passed]
+
+        scores += ratios * weight
+        reachable = (scores + max_remaining_score) >= score_cutoff
+        rows, cols, scores = rows[reachable], cols[reachable], scores[reachable]
+
+    matched = scores >= score_cutoff
+    rows, cols, scores = rows[matched], cols[matched], scores[matched]
+    if sparse:
+        return rows, cols, scores
+
+    matrix = np.zeros((len(queries), len(choices)))
+    matrix[rows, cols] = scores
+    return matrix
+
+
+def weighted_cpdist(queries, choices, score_cutoff=0,
+                    weights: Optional[tuple[float]] = None,
+                    scorers: tuple[Callable] = (
+                        fuzz.ratio, fuzz.token_set_ratio),
+                    workers: int = 1):
+    """
+    Element-wise weighted_cdist: score queries[i] against choices[i]
+    with rapidfuzz.process.cpdist, pruning pairs likewise.
+
+    Returns
+    -------
+    (positions, weighted scores) of pairs atleast score_cutoff, in order.
+
+    """
+    if weights is None:
+        weights = map(lambda _: 1, scorers)
+    weights = normalize(weights)
+
+    queries = np.asarray(queries, object)
+    choices = np.asarray(choices, object)
+    pairs = np.arange(len(queries))
+    scores = np.zeros(len(queries))
+    stages = zip(scorers, weights, min_cutoffs(score_cutoff, weights))
+    for scorer, weight, (min_cutoff, max_remaining_score) in stages:
+        ratios = process.cpdist(
+            queries[pairs], choices[pairs], scorer=scorer,
+            score_cutoff=min_cutoff, dtype=np.float64, workers=workers)
+        passed = ratios >= min_cutoff
+        pairs = pairs[passed]
+        scores[pairs] += ratios[passed] * weight
+        reachable = (scores[pairs] + max_remaining_score) >= score_cutoff
+        pairs = pairs[reachable]
+
+    pairs = pairs[scores[pairs] >= score_cutoff]
+    return pairs, scores[pairs]
+
+
+class NeighborSearch:
+    """
+    Score a batch of names against themselves and all names after them,
+    i.e. the upper triangle of the similarity matrix for symmetric scorers.
+
+    Blocking:
+        When fuzz.ratio scores first, it must reach its minimum cutoff r
+        (refer to min_cutoffs), and ratio = 200·LCS / (len₁ + len₂)
+        ≤ 200·min(len) / (len₁ + len₂), hence a name of length l may only
+        match names of lengths within [l·r / (200 - r), l·(200 - r) / r].
+        A batch is split into buckets of names of similar lengths, each
+        scored only against the names within the lengths its names may match,
+        rather than all of them. Scores are identical.
+
+    """
+
+    def __init__(self, names, score_cutoff: float,
+                 weights: tuple[float], scorers: tuple[Callable],
+                 batch_size: int = BATCH_SIZE, blocking: bool = True):
+        self.names = np.asarray(names, object)
+        self.score_cutoff = score_cutoff
+        self.weights = weights
+        self.scorers = scorers
+        self.batch_size = batch_size
+        self.ratio_cutoff = 0
+        if blocking and scorers[0] is fuzz.ratio:
+            normalized = normalize(weights or [1] * len(scorers))
+            (self.ratio_cutoff, _), *_ = min_cutoffs(score_cutoff, normalized)
+        self.lengths = np.fromiter(map(len, self.names), np.int64,
+                                   len(self.names))
+        self.by_length = np.argsort(self.lengths, kind='stable')
+
+    def buckets(self, queries, choices):
+        """
+        (queries, choices) of each length bucket of queries, choices being
+        those within the lengths its queries may match, ordered by length.
+
+        """
+        if self.ratio_cutoff <= 0:
+            return [(queries, choices)]
+        r = self.ratio_cutoff
+        included = np.zeros(len(self.names), bool)
+        included[choices] = True
+        by_length = self.by_length[included[self.by_length]]
+        lengths = self.lengths[by_length]
+
+        query_lengths = self.lengths[queries]
+        bucket_ids = np.floor(np.log(np.maximum(query_lengths, 1)) /
+                              np.log(LENGTH_BUCKET))
+        buckets = []
+        for bucket_id in np.unique(bucket_ids):
+            bucket = queries[bucket_ids == bucket_id]
+            # widened for floating point error, extra names score 0 anyway
+            lowest = self.lengths[bucket].min() * r / (200 - r) - 1e-6
+            highest = self.lengths[bucket].max() * (200 - r) / r + 1e-6
+            buckets.append((bucket, by_length[
+                np.searchsorted(lengths, lowest):
+                np.searchsorted(lengths, highest, 'right')]))
+
+        # smaller blocks score slower, worth it only for fewer pairs
+        pairs = sum(len(b) * len(c) for b, c in buckets)
+        if pairs > BLOCKING_MAX_PAIRS * len(queries) * len(choices):
+            return [(queries, choices)]
+        return buckets
+
+    def __call__(self, start, alive=None):
+        """
+        Parameters
+        ----------
+        start   : position of the first name in the batch.
+        alive   : boolean mask of names to score, defaults to all names.
+
+        Returns
+        -------
+        (rows, cols, scores) name positions of pairs atleast score_cutoff,
+        ordered by row then col.
+
+        """
+        choices = np.arange(start, len(self.names))
+        if alive is not None:
+            choices = choices[alive[start:]]
+        # queries lead choices
+        queries = choices[choices < start + self.batch_size]
+        if not len(queries):
+            return np.array([], int), np.array([], int), np.array([])
+
+        rows, cols, scores = [], [], []
+        for bucket, bucket_choices in self.buckets(queries, choices):
+            step = max(MAX_CELLS // len(bucket), 1)
+            for i in range(0, len(bucket_choices), step):
+                sub_choices = bucket_choices[i:i + step]
+                sub_rows, sub_cols, sub_scores = weighted_cdist(
+                    self.names[bucket], self.names[sub_choices],
+                    score_cutoff=self.score_cutoff,
+                    weights=self.weights,
+                    scorers=self.scorers,
+                    sparse=True)
+                rows.append(bucket[sub_rows])
+                cols.append(sub_choices[sub_cols])
+                scores.append(sub_scores)
+        rows, cols, scores = map(np.concatenate, (rows, cols, scores))
+
+        # restore row major order across buckets and column chunks
+        order = np.lexsort((cols, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        upper = cols >= rows
+        return rows[upper], cols[upper], scores[upper]
+
+
+# per process NeighborSearch, inherited by forked workers
+neighbor_search = None
+
+
+def init_neighbor_search(search: NeighborSearch):
+    global neighbor_search
+    neighbor_search = search
+
+
+def search_neighbors(start):
+    return neighbor_search(start)
+
+
+def neighbors(names, score_cutoff: float,
+              weights: tuple[float], scorers: tuple[Callable],
+              batch_size: int = BATCH_SIZE, workers: int = 1,
+              blocking: bool = True):
+    """
+    Thresholded similarity graph of names, with batches of names
+    searched in parallel across `workers` processes,
+    blocked by length if `blocking`, refer to NeighborSearch.
+    Batches are merged in order, hence the graph is independent of `workers`.
+
+    Returns
+    -------
+    (rows, cols, scores) name positions of pairs atleast score_cutoff,
+    where row ≤ col, ordered by row then col.
+
+    """
+    search = NeighborSearch(names, score_cutoff, weights, scorers,
+                            batch_size, blocking)
+    # atleast one, possibly empty, batch to concatenate
+    starts = range(0, max(len(names), 1), batch_size)
+
+    def reported(batches):
+        for start, batch in zip(starts, batches):
+            report('fuzzy neighbors', min(start + batch_size, len(names)),
+                   len(names))
+            yield batch
+
+    if workers == 1:
+        batches = map(search, starts)
+        return tuple(map(np.concatenate, zip(*reported(batches))))
+
+    # fork to share names copy-on-write instead of pickling them per worker
+    method = 'fork' \
+        if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=init_neighbor_search,
+            initargs=(search,)) as executor:
+        batches = executor.map(search_neighbors, starts)
+        return tuple(map(np.concatenate, zip(*reported(batches))))
+
+
+def cached_neighbors(cache: DiskCache, raw_names,
+                     ignore_keywords: Optional[list], score_cutoff: float,
+                     weights: tuple[float], scorers: tuple[Callable],
+                     batch_size: int = BATCH_SIZE, workers: int = 1,
+                     search: bool = False):
+    """
+    Processed names and their neighbors down to NEIGHBORS_FLOOR,
+    or `score_cutoff` if lower. Loaded from `cache` when the same names
+    were searched with the same ignore_keywords, searched and cached
+    otherwise once the names are seen again, or at once if `search`.
+
+    Searching down to the floor costs several greedy runs at a higher
+    similarity, which skip names already grouped, hence names seen for
+    the first time are only marked as seen, to be grouped by the caller.
+
+    Returns
+    -------
+    (names, graph) where graph is the output of neighbors,
+    None for names seen for the first time unless `search`.
+
+    """
+    key = content_hash(repr(weights), repr([s.__name__ for s in scorers]),
+                       repr(ignore_keywords), raw_names)
+    seen_key = content_hash(key, 'seen')
+
+    def load(path):
+        with np.load(path, allow_pickle=False) as cached:
+            if cached['floor'] > score_cutoff:
+                return None
+            # processed names never contain a newline
+            names = cached['names'].tobytes().decode()
+            names = tuple(names.split('\n')) if names else ()
+            return names, tuple(cached[k] for k in ('rows', 'cols', 'scores'))
+
+    loaded = cache.read(key, load)
+    if loaded is not None:
+        return loaded
+
+    names = tuple(process_names(pd.Series(raw_names, dtype=object),
+                                ignore_keywords))
+    seen = cache.read(seen_key, os.path.exists) or \
+        cache.read(key, os.path.exists)
+    if not (seen or search):
+        cache.write(seen_key, lambda file: None)
+        return names, None
+
+    floor = min(score_cutoff, NEIGHBORS_FLOOR)
+    graph = neighbors(names, floor, weights, scorers, batch_size, workers)
+    rows, cols, scores = graph
+    cache.write(key, lambda file: np.savez(
+        file, floor=floor, rows=rows, cols=cols, scores=scores,
+        names=np.frombuffer('\n'.join(names).encode(), np.uint8)))
+    cache.remove(seen_key)
+    return names, graph
+
+
+def greedy_matches(names, score_cutoff: float,
+                   weights: tuple[float], scorers: tuple[Callable],
+                   batch_size: int = 0, workers: int = 1,
+                   graph: Optional[tuple] = None, blocking: bool = True):
+    """
+    Greedily group names in order: each remaining name in turn claims
+    all remaining names atleast `score_cutoff` similar, including itself.
+
+    Scorers must be symmetric: names before the ith name have either
+    been claimed or didn't claim it, therefore the ith name only
+    needs to be scored against names after it.
+
+    Parameters
+    ----------
+    names       : sequence of processed names.
+    batch_size  : number of names scored at once against remaining names
+        by weighted_cdist, 0 to score each name individually with weighted_extract.
+    workers     : number of processes to search neighbors of all names in
+        batches beforehand, instead of batches of remaining names in turn.
+    graph       : neighbors of names searched beforehand at a cutoff
+        atmost `score_cutoff`, e.g. loaded from a cache.
+        Its pairs atleast `score_cutoff` are rescored at `score_cutoff`,
+        since scorers round differently near their cutoff.
+    blocking    : whether batches only score names of lengths
+        they may match, refer to NeighborSearch.
+
+    Yields
+    ------
+    (k, ((key, score), ...)) for every name k starting a group.
+
+    """
+    alive = np.ones(len(names), bool)
+
+    def claim(k, keys, scores):
+        alive[keys] = False
+        return k, tuple(zip(keys, scores))
+
+    if graph is not None:
+        rows, cols, scores = graph
+        candidates = scores >= score_cutoff
+        rows, cols = rows[candidates], cols[candidates]
+        names = np.asarray(names, object)
+        matched, scores = weighted_cpdist(
+            names[rows], names[cols], score_cutoff, weights, scorers)
+        batches = [(rows[matched], cols[matched], scores)]
+    elif not batch_size:
+        compare = dict(enumerate(names))
+        for k in range(len(names)):
+            if not alive[k]:
+                continue
+            matches = tuple(weighted_extract(
+                names[k],
+                compare,
+                processor=None,
+                scorers=scorers,
+                weights=weights,
+                short_circuit=False,
+                score_cutoff=score_cutoff))
+            keys = [key for (key, _), _ in matches]
+            for key in keys:
+                compare.pop(key)
+            yield claim(k, keys, [score for (_, score), _ in matches])
+        return
+    elif workers > 1:
+        batches = [neighbors(names, score_cutoff, weights, scorers,
+                             batch_size=batch_size, workers=workers,
+                             blocking=blocking)]
+    else:
+        search = NeighborSearch(
+            names, score_cutoff, weights, scorers, batch_size, blocking)
+        batches = (search(start, alive)
+                   for start in range(0, len(names), batch_size))
+
+    for rows, cols, scores in batches:
+        # matches are row major i.e. grouped by name
+        ks, bounds = np.unique(rows, return_index=True)
+        bounds = np.append(bounds, len(rows))
+        for k, first, last in zip(ks.tolist(), bounds[:-1], bounds[1:]):
+            if not alive[k]:
+                continue
+            keys = cols[first:last]
+            remaining = alive[keys]
+            yield claim(k, keys[remaining].tolist(),
+                        scores[first:last][remaining].tolist())
+
+
+def cpu_workers(workers: int):
+    """
+    Number of processes for `workers`, -1 for all cores.
+
+    """
+    cores = os.cpu_count() or 1
+    return cores if workers == -1 else min(max(workers, 1), cores)
+
+
 def fuzzyfy(df: pd.DataFrame, similarity: float = 90,
-            ignore_keywords: Optional[list] = None):
+            ignore_keywords: Optional[list] = None,
+            batch_size: int = BATCH_SIZE,
+            workers: int = 1, cache: Optional[DiskCache] = None,
+            blocking: bool = True):
     """
     Groupby fuzzyfied names and aggregate Count and optional summable columns:
     - names are lowercased,
@@ -173,12 +710,31 @@ def fuzzyfy(df: pd.DataFrame, similarity: float = 90,
         where Ψ is the comparison input size at ith iteration starting with n names.
         Then, the time complexity can be expressed as Ω(integral(0, n, Ψ(i,n)·di)).
 
+    Blocking:
+        Rather than decaying Ψ, batches only score names whose lengths
+        allow a match at all, refer to NeighborSearch. This stays quadratic,
+        with a constant shrinking as `similarity` grows. Blocking by shared
+        tokens and q-grams prunes more pairs but, since token_set_ratio
+        matches names sharing any token, shortlists a few percent of names
+        at a higher cost per pair than scoring them all with cdist.
+
     Parameters
     ----------
     df               : dataframe with Name: string, Count: number, *ExtraColumns: number columns.
     similarity       : number between 0-100; names to be considered within the same group,
         if they are `similarity` percent match.
     ignore_keywords  : keywords to be ignored from comparison.
+    batch_size       : number of names scored at once with weighted_cdist,
+        0 to score names individually with weighted_extract.
+        Groups are identical regardless of batching.
+    workers          : number of processes for batched scoring, -1 for all cores.
+        Groups are identical regardless of workers.
+    cache            : cache of processed names and their neighbors
+        down to NEIGHBORS_FLOOR, searched by the second run on the same
+        names and ignore_keywords, answering later runs at any similarity
+        above the floor. Groups are identical with or without cache.
+    blocking         : whether batches only score names of lengths
+        they may match. Groups are identical regardless of blocking.
 
     Returns
     -------
@@ -186,58 +742,139 @@ def fuzzyfy(df: pd.DataFrame, similarity: float = 90,
                    Name, Count, *ExtraColumns, Similarity columns.
 
     """
-    size = len(df.columns)
-    pd_nas = (pd.NA,) * size
+    weights = WEIGHTS
+    scorers = SCORERS
+    workers = cpu_workers(workers)
 
-    TOKEN_SET_WEIGHT = 0.725
-    weights = (1 - TOKEN_SET_WEIGHT, TOKEN_SET_WEIGHT)
-    scorers = (fuzz.ratio, fuzz.token_set_ratio)
+    name_col = df.columns[0]
+    if cache is None:
+        # we got memory but no time! 🏃
+        names = tuple(process_names(df[name_col], ignore_keywords))
+        groups = greedy_matches(names, similarity, weights, scorers,
+                                batch_size=batch_size, workers=workers,
+                                blocking=blocking)
+    else:
+        names, graph = cached_neighbors(
+            cache, df[name_col], ignore_keywords, similarity, weights,
+            scorers, batch_size or BATCH_SIZE, workers)
+        groups = greedy_matches(names, similarity, weights, scorers,
+                                batch_size=batch_size, workers=workers,
+                                graph=graph, blocking=blocking)
+
+    return fuzzy_frame(df, groups)
+
+
+def fuzzyfy_thresholds(df: pd.DataFrame, similarities: list[float],
+                       ignore_keywords: Optional[list] = None,
+                       batch_size: int = BATCH_SIZE, workers: int = 1,
+                       cache: Optional[DiskCache] = None):
+    """
+    fuzzyfy at each of `similarities`, scoring names only once: their
+    neighbors are searched at the lowest similarity, or loaded from `cache`,
+    and names are greedily grouped at each similarity from those neighbors,
+    at about the cost of a single fuzzyfy at the lowest similarity.
+    Groups are identical to fuzzyfy's at each similarity.
+
+    Returns
+    -------
+    dict of fuzzyfy's output by similarity, in order of `similarities`.
+
+    """
+    weights = WEIGHTS
+    scorers = SCORERS
+    workers = cpu_workers(workers)
+    lowest = min(similarities)
 
     name_col = df.columns[0]
-    # we got memory but no time! 🏃
-    compare = dict(df[name_col].apply(processor(ignore_keywords)))
-    rows = list(df.values)
-    for k, row in enumerate(rows):
-        # ignore if already processed
-        if len(row) > size:
-            continue
-
-        matches = weighted_extract(
-            compare[k],
-            compare,
-            processor=None,
-            scorers=scorers,
-            weights=weights,
-            short_circuit=False,
-            score_cutoff=similarity)
-
-        # Steering away from dataframe indexing - required when groupby.agg
-        # was used - provided considerable performance benefit in the past.
-        # Now with rapidfuzz, we may switch back to pandas aggregation
-        # to improve readability. But, customized sorting
-        # is still best suited on df.values.
-        fuzzy_name = row[0]
-        fuzzy_sums = [0] * (size - 1)
-        for (key, score), _ in tuple(matches):
-            _, *values = rows[key]
-            rows[key] = pd_nas + (*rows[key], score, k)
-            for i, val in enumerate(values):
-                fuzzy_sums[i] += val
-            compare.pop(key)
-
-        # set fuzzy name row
-        rows[k] = (fuzzy_name, *fuzzy_sums) + rows[k][size:]
-
-    def sort(row):
-        name, count, *extras, score, key = row[size:]
-        fuzzy_name, fuzzy_count, *fuzzy_sums = rows[key][0:size]
-        break_tie_eq_fuzzy_values = fuzzy_count + 1 \
-            if fuzzy_name == name else count
-        return (fuzzy_count, *fuzzy_sums, fuzzy_name,
-                break_tie_eq_fuzzy_values, *extras, score, name)
-
-    columns = tuple(df.columns.map(lambda col: f'Fuzzy{col}')) + \
-        tuple(df.columns) + ('Similarity', 'key')
-
-    return pd.DataFrame(sorted(rows, key=sort, reverse=True),
-                        columns=columns).drop('key', axis=1)
+    if cache is None:
+        names = tuple(process_names(df[name_col], ignore_keywords))
+        graph = neighbors(names, lowest, weights, scorers,
+                          batch_size or BATCH_SIZE, workers)
+    else:
+        names, graph = cached_neighbors(
+            cache, df[name_col], ignore_keywords, lowest, weights,
+            scorers, batch_size or BATCH_SIZE, workers, search=True)
+
+    return {similarity: fuzzy_frame(df, greedy_matches(
+        names, similarity, weights, scorers, graph=graph))
+        for similarity in similarities}
+
+
+def descending(values):
+    """
+    Sort key of values in descending order, for np.lexsort.
+
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iufb':
+        return -values.astype(np.float64)
+    codes, _ = pd.factorize(values, sort=True)
+    return -codes
+
+
+def take(col: pd.Series, positions):
+    """
+    Values of col at positions, missing at -1, integers remaining integers.
+
+    """
+    array = col.array
+    if isinstance(col.dtype, np.dtype) and col.dtype.kind in 'iub':
+        array = pd.array(col.to_numpy())
+    return array.take(positions, allow_fill=True)
+
+
+def fuzzy_frame(df: pd.DataFrame, groups):
+    """
+    Output of fuzzyfy for groups of df's rows.
+
+    Group assignments and scores are kept in typed arrays, rather than
+    a tuple of boxed values per row, and fuzzy values are summed and
+    sorted by vectorized groupby and lexsort.
+
+    Parameters
+    ----------
+    df      : dataframe with Name: string, Count: number, *ExtraColumns: number columns.
+    groups  : (k, ((key, score), ...)) for every row k leading a group
+        of rows key, including itself, as yielded by greedy_matches.
+
+    """
+    n = len(df)
+    leaders = np.empty(n, np.int64)
+    scores = np.empty(n)
+    grouped = 0
+    for k, matches in groups:
+        keys, key_scores = zip(*matches)
+        keys = np.fromiter(keys, np.int64, len(keys))
+        leaders[keys] = k
+        scores[keys] = key_scores
+        grouped += len(keys)
+        report('fuzzyfy', grouped, n)
+
+    # groups numbered in order of their leader's row
+    group = np.unique(leaders, return_inverse=True)[1]
+    name_col, *value_cols = df.columns
+    names = df[name_col].to_numpy(object)
+    values = [df[col].to_numpy() for col in value_cols]
+    fuzzy_values = [df[col].groupby(group).sum() for col in value_cols]
+    lead = leaders == np.arange(n)
+
+    # by fuzzy values of each row's group, then the row's own, descending
+    group_keys = [descending(col.to_numpy())[group] for col in fuzzy_values]
+    # leaders first within their group
+    tie = np.where(names == names[leaders],
+                   fuzzy_values[0].to_numpy()[group] + 1, values[0])
+    name_keys = descending(names)
+    order = np.lexsort((
+        name_keys, -scores,
+        *map(descending, reversed(values[1:])), -tie,
+        name_keys[leaders], *reversed(group_keys)))
+
+    fuzzy_rows = np.where(lead, group, -1)[order]
+    output = {f'Fuzzy{name_col}': take(
+        df[name_col], np.where(lead, np.arange(n), -1)[order])}
+    for col, fuzzy_col in zip(value_cols, fuzzy_values):
+        output[f'Fuzzy{col}'] = take(fuzzy_col, fuzzy_rows)
+    for col in df.columns:
+        output[col] = df[col].array.take(order)
+    output['Similarity'] = scores[order]
+    return pd.DataFrame(output)
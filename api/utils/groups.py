@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Optional
+from .cache import DiskCache, content_hash
+from .progress import report
+from .fuzzy import (
+    WEIGHTS,
+    SCORERS,
+    BATCH_SIZE,
+    MAX_CELLS,
+    fuzzyfy,
+    fuzzy_frame,
+    cpu_workers,
+    greedy_matches,
+    process_names,
+    weighted_cdist,
+    weighted_cpdist,
+)
+
+GROUPS_MAX_BYTES = int(os.environ.get('GROUPS_MAX_BYTES', 1 << 30))
+
+
+def leader_mask(df: pd.DataFrame):
+    """
+    Rows of fuzzyfy's output leading their group,
+    followed by the rest of their group.
+
+    """
+    return df[df.columns[0]].notna().to_numpy()
+
+
+def name_column(df: pd.DataFrame):
+    return df.columns[0][len('Fuzzy'):]
+
+
+class FuzzyGroups:
+    """
+    Group assignments of a fuzzyfy run of a series: the group of each
+    name, numbered in order of the output, their similarity to their
+    group's leader and the processed names of the leaders.
+
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.names = pd.Index(
+            table.column('Name').to_numpy(zero_copy_only=False))
+        self.groups = table.column('Group').to_numpy()
+        self.scores = table.column('Similarity').to_numpy()
+        leaders = np.flatnonzero(np.diff(self.groups, prepend=-1))
+        self.leader_names = self.names[leaders]
+        self.leaders = table.column('Processed').take(leaders) \
+            .to_numpy(zero_copy_only=False)
+        self.ngroups = len(leaders)
+        metadata = table.schema.metadata
+        self.series = metadata[b'series'].decode()
+        self.similarity = float(metadata[b'similarity'])
+        self.ignore_keywords = json.loads(metadata[b'ignore_keywords'])
+        self.saved = float(metadata[b'saved'])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, series: str, similarity: float,
+                   ignore_keywords: Optional[list] = None):
+        """
+        Groups of fuzzyfy's output `df` of `series`.
+
+        """
+        leader = leader_mask(df)
+        names = df[name_column(df)].astype(object)
+        processed = np.full(len(df), None, object)
+        processed[leader] = process_names(names[leader], ignore_keywords)
+        table = pa.table({
+            'Name': pa.array(names, pa.string()),
+            'Group': pa.array(np.cumsum(leader) - 1, pa.int64()),
+            'Similarity': pa.array(
+                df['Similarity'].to_numpy(np.float64), pa.float64()),
+            'Processed': pa.array(processed, pa.string())})
+        return cls(table.replace_schema_metadata({
+            b'series': series.strip().encode(),
+            b'similarity': str(float(similarity)).encode(),
+            b'ignore_keywords': json.dumps(ignore_keywords or []).encode(),
+            b'saved': str(time.time()).encode()}))
+
+
+class GroupStore:
+    """
+    Groups of the latest corporation_count run of each series, e.g. of
+    monthly contacts files, at each similarity and set of ignore_keywords,
+    for the next run of the series to carry over. Named by the caller,
+    since nothing in an upload tells which earlier one it follows.
+    Stored as parquet named by a hash of all three, evicted least recently
+    used first once their total size exceeds `max_bytes`.
+
+    Parameters
+    ----------
+    directory  : created if missing.
+    max_bytes  : total size of groups to keep.
+
+    """
+
+    def __init__(self, directory: str, max_bytes: int = GROUPS_MAX_BYTES):
+        self.cache = DiskCache(directory, max_bytes, '.parquet')
+
+    @staticmethod
+    def key(series: str, similarity: float,
+            ignore_keywords: Optional[list] = None):
+        if not series or not series.strip():
+            raise ValueError('Series name is required for incremental runs')
+        return content_hash(
+            series.strip(), repr(float(similarity)), repr(WEIGHTS),
+            repr([s.__name__ for s in SCORERS]),
+            sorted({k.lower() for k in ignore_keywords or ()}))
+
+    def get(self, series: str, similarity: float,
+            ignore_keywords: Optional[list] = None):
+        return self.cache.read(
+            self.key(series, similarity, ignore_keywords),
+            lambda path: FuzzyGroups(pq.read_table(path)))
+
+    def save(self, groups: FuzzyGroups):
+        self.cache.write(
+            self.key(groups.series, groups.similarity,
+                     groups.ignore_keywords),
+            lambda file: pq.write_table(groups.table, file))
+
+
+def incremental_matches(raw_names, previous: FuzzyGroups,
+                        score_cutoff: float, ignore_keywords=None,
+                        batch_size: int = BATCH_SIZE, workers: int = 1):
+    """
+    greedy_matches carried over from `previous` groups: names seen before
+    stay in their group, new names join the earliest group whose leader
+    they're atleast `score_cutoff` similar to, as that group would have
+    claimed them first, and the remaining new names are grouped greedily
+    among themselves after the previous groups.
+
+    A group whose leader is gone is led by its first remaining name,
+    its members rescored against it.
+
+    Yields
+    ------
+    (k, ((key, score), ...)) for every name k leading a group, by group.
+
+    """
+    weights, scorers = WEIGHTS, SCORERS
+    raw_names = pd.Index(np.asarray(raw_names, object))
+    codes = previous.names.get_indexer(raw_names)
+    known = codes >= 0
+    groups = np.where(known, previous.groups[codes], -1)
+    scores = np.where(known, previous.scores[codes], 0.)
+
+    new = np.flatnonzero(~known)
+    processed = np.full(len(raw_names), None, object)
+    processed[new] = process_names(
+        pd.Series(raw_names[new], dtype=object), ignore_keywords)
+    step = max(MAX_CELLS // max(previous.ngroups, 1), 1)
+    for start in range(0, len(new) if previous.ngroups else 0, step):
+        batch = new[start:start + step]
+        report('fuzzy groups', start + len(batch), len(new))
+        rows, cols, batch_scores = weighted_cdist(
+            processed[batch], previous.leaders, score_cutoff,
+            weights, scorers, workers=workers, sparse=True)
+        # ordered by name then group, hence the earliest group first
+        _, firsts = np.unique(rows, return_index=True)
+        groups[batch[rows[firsts]]] = cols[firsts]
+        scores[batch[rows[firsts]]] = batch_scores[firsts]
+
+    rest = new[groups[new] < 0]
+    ngroups = previous.ngroups
+    for k, matches in greedy_matches(
+            tuple(processed[rest]), score_cutoff, weights, scorers,
+            batch_size=batch_size, workers=workers):
+        keys, key_scores = map(list, zip(*matches))
+        groups[rest[keys]] = ngroups
+        scores[rest[keys]] = key_scores
+        ngroups += 1
+
+    order = np.argsort(groups, kind='stable')
+    starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+    bounds = np.append(starts, len(order))
+    ids = groups[order[starts]]
+    # first remaining name, in order of raw_names, unless the leader remains
+    leaders = np.full(ngroups, -1)
+    leaders[ids] = order[starts]
+    previous_leaders = raw_names.get_indexer(previous.leader_names)
+    remains = previous_leaders >= 0
+    leaders[:previous.ngroups][remains] = previous_leaders[remains]
+
+    led = np.zeros(ngroups, bool)
+    led[ids[ids < previous.ngroups]] = True
+    led[:previous.ngroups] &= ~remains
+    rescored = np.flatnonzero(led[groups])
+    if len(rescored):
+        missing = rescored[pd.isna(processed[rescored])]
+        processed[missing] = process_names(
+            pd.Series(raw_names[missing], dtype=object), ignore_keywords)
+        _, scores[rescored] = weighted_cpdist(
+            processed[leaders[groups[rescored]]], processed[rescored], 0,
+            weights, scorers, workers)
+
+    leaders = leaders.tolist()
+    for id, first, last in zip(ids.tolist(), bounds[:-1], bounds[1:]):
+        keys = order[first:last]
+        yield leaders[id], tuple(zip(keys.tolist(), scores[keys].tolist()))
+
+
+def changes(previous: FuzzyGroups, df: pd.DataFrame):
+    """
+    Change of each group of fuzzyfy's output `df` since `previous`,
+    on their leading rows, compared to the previous group of their leader:
+    - new: of new names only.
+    - grown: joined by names, new or from other groups.
+    - shrunk: left by names, gone or to other groups.
+    - changed: both, or led by a new name.
+    - renamed: of the same names, led by another one.
+    - otherwise empty.
+
+    """
+    leader = leader_mask(df)
+    names = df[name_column(df)].astype(object)
+    current = np.cumsum(leader) - 1
+    ngroups = leader.sum()
+    codes = previous.names.get_indexer(names)
+    before = np.where(codes >= 0, previous.groups[codes], -1)
+
+    group_before = before[leader]
+    same = before == group_before[current]
+    joined = np.bincount(current, ~same, ngroups) > 0
+    kept = np.bincount(current, same & (before >= 0), ngroups)
+    sizes = np.bincount(previous.groups, minlength=previous.ngroups)
+    was = group_before >= 0
+    left = was & (kept < sizes[np.where(was, group_before, 0)])
+    renamed = was & (
+        previous.leader_names[np.where(was, group_before, 0)].to_numpy()
+        != names[leader].to_numpy())
+
+    labels = np.select(
+        [~was & ~joined, (joined & left) | ~was, joined, left, renamed],
+        ['new', 'changed', 'grown', 'shrunk', 'renamed'], '')
+    change = np.full(len(df), None, object)
+    change[leader] = labels
+    return pd.array(change, 'string')
+
+
+def incremental_fuzzyfy(df: pd.DataFrame, store: GroupStore, series: str,
+                        similarity: float = 90,
+                        ignore_keywords: Optional[list] = None,
+                        rebuild: bool = False,
+                        batch_size: int = BATCH_SIZE, workers: int = 1,
+                        cache: Optional[DiskCache] = None):
+    """
+    fuzzyfy carrying over the groups of the previous run of `series` on
+    `store` at the same similarity and ignore_keywords, by incremental_matches,
+    hence only names not seen before are scored: against the previous
+    groups' leaders and each other. Groups are saved for the next run.
+
+    Groups depend on the order names were first seen in, unlike
+    fuzzyfy's greedy order on the latest names alone. `rebuild` groups
+    them by fuzzyfy instead, to check the drift of incremental runs.
+
+    Returns
+    -------
+    fuzzyfy's output, along with FuzzyChange columns of changes since
+    the previous run if any, and IncrementalFuzzyName of each name
+    had it been grouped incrementally if `rebuild`.
+
+    """
+    keywords = sorted({k.lower() for k in ignore_keywords or ()})
+    workers = cpu_workers(workers)
+    previous = store.get(series, similarity, keywords)
+
+    def incremental():
+        return fuzzy_frame(df, incremental_matches(
+            df[df.columns[0]], previous, similarity, keywords,
+            batch_size or BATCH_SIZE, workers))
+
+    if previous is None or rebuild:
+        dff = fuzzyfy(df, similarity, keywords, batch_size=batch_size,
+                      workers=workers, cache=cache)
+    else:
+        dff = incremental()
+
+    if previous is not None:
+        dff['FuzzyChange'] = changes(previous, dff)
+        if rebuild:
+            dfi = incremental()
+            fuzzy_names = dfi[dfi.columns[0]].ffill()
+            fuzzy_names.index = dfi[name_column(dfi)]
+            dff['IncrementalFuzzyName'] = pd.array(
+                fuzzy_names.reindex(dff[name_column(dff)]).to_numpy(),
+                'string')
+
+    report('save groups')
+    store.save(FuzzyGroups.from_frame(dff, series, similarity, keywords))
+    return dff
@@ -0,0 +1,219 @@
+import os
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# directory to dump a cProfile of each RPC call to, unset not to profile
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+
+def peak_rss():
+    """
+    Peak resident memory of the process in bytes, None if unknown.
+
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profile:
+    """
+    Stages of an RPC call, as named by progress.report, with their wall
+    time, the rows they read and wrote as counted by `rows`, and the peak
+    resident memory of the process by their end.
+
+    """
+
+    def __init__(self, function: str):
+        self.function = function
+        self.started = time.perf_counter()
+        self.seconds = None
+        # stages by name, in the order they started, resumed if reported again
+        self.stages = {}
+        self.current = None
+
+    def stage(self, name: str):
+        if name == self.current:
+            return
+        self.end_stage()
+        self.current = name
+        self.stages.setdefault(name, dict(
+            stage=name, seconds=0., rows_in=None, rows_out=None,
+            peak_rss=None))['started'] = time.perf_counter()
+
+    def end_stage(self):
+        if self.current is not None:
+            stage = self.stages[self.current]
+            stage['seconds'] += time.perf_counter() - stage.pop('started')
+            stage['peak_rss'] = peak_rss()
+            self.current = None
+
+    def rows(self, rows_in: Optional[int] = None,
+             rows_out: Optional[int] = None):
+        if self.current is None:
+            self.stage(self.function)
+        stage = self.stages[self.current]
+        if rows_in is not None:
+            stage['rows_in'] = (stage['rows_in'] or 0) + rows_in
+        if rows_out is not None:
+            stage['rows_out'] = (stage['rows_out'] or 0) + rows_out
+
+    def finish(self):
+        self.end_stage()
+        self.seconds = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Server-Timing header value of the stages and the total, in ms.
+
+        """
+        return ', '.join(
+            f'{name.replace(" ", "-")};dur={seconds * 1000:.1f}'
+            for name, seconds in [
+                *((s['stage'], s['seconds']) for s in self.stages.values()),
+                ('total', self.seconds)])
+
+
+# profile of the RPC call running in this context
+profile: ContextVar[Optional[Profile]] = ContextVar('profile', default=None)
+
+
+def stage(name: str):
+    """
+    Start stage `name` of the RPC call being profiled, if any.
+
+    """
+    current = profile.get()
+    if current is not None:
+        current.stage(name)
+
+
+def rows(rows_in: Optional[int] = None, rows_out: Optional[int] = None):
+    """
+    Count rows read and written by the current stage, if profiled,
+    e.g. rows(len(contacts), len(diff)).
+
+    """
+    current = profile.get()
+    if current is not None:
+        current.rows(rows_in, rows_out)
+
+
+class Metrics:
+    """
+    Totals of profiled RPC calls by function and stage, exposed in
+    Prometheus text format.
+
+    """
+
+    def __init__(self):
+        # created on import before gevent patches threading,
+        # hence a native lock shared by jobs' threads and greenlets
+        self.lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.stage_rows = defaultdict(int)
+        self.stage_peak_rss = {}
+        # (profile, status) of calls added since, if a list, e.g. kept by
+        # worker processes to add them to the server's metrics
+        self.profiles = None
+
+    @contextmanager
+    def profiled(self, function: str, directory: Optional[str] = PROFILE_DIR):
+        """
+        Profile the RPC call `function` run in this context and add
+        it to the totals, dumping its cProfile stats to `directory`
+        as `function`-`timestamp`.prof if set.
+
+        """
+        current = Profile(function)
+        token = profile.set(current)
+        profiler = cProfile.Profile() if directory else None
+        status = 'error'
+        try:
+            if profiler:
+                profiler.enable()
+            yield current
+            status = 'ok'
+        finally:
+            current.finish()
+            profile.reset(token)
+            if profiler:
+                profiler.disable()
+                os.makedirs(directory, exist_ok=True)
+                profiler.dump_stats(os.path.join(
+                    directory, f'{function}-{time.time():.6f}.prof'))
+            self.add(current, status)
+
+    def add(self, current: Profile, status: str):
+        if self.profiles is not None:
+            self.profiles.append((current, status))
+        with self.lock:
+            self.calls[(current.function, status)] += 1
+            self.seconds[current.function] += current.seconds
+            for stage in current.stages.values():
+                key = (current.function, stage['stage'])
+                self.stage_calls[key] += 1
+                self.stage_seconds[key] += stage['seconds']
+                for direction in ('in', 'out'):
+                    if stage[f'rows_{direction}'] is not None:
+                        self.stage_rows[(*key, direction)] += \
+                            stage[f'rows_{direction}']
+                if stage['peak_rss'] is not None:
+                    self.stage_peak_rss[key] = max(
+                        self.stage_peak_rss.get(key, 0), stage['peak_rss'])
+
+    def prometheus(self):
+        def labels(names, values):
+            return ','.join(f'{name}="{value}"'
+                            for name, value in zip(names, values))
+
+        def metric(name, kind, help, values, names):
+            yield f'# HELP {name} {help}'
+            yield f'# TYPE {name} {kind}'
+            for key, value in sorted(values.items()):
+                yield f'{name}{{{labels(names, key)}}} {value}'
+
+        function = ('function',)
+        stage = ('function', 'stage')
+        with self.lock:
+            lines = [
+                *metric('rpc_calls_total', 'counter',
+                        'RPC calls by outcome.',
+                        self.calls, ('function', 'status')),
+                *metric('rpc_seconds_total', 'counter',
+                        'Wall time of RPC calls.',
+                        {(k,): v for k, v in self.seconds.items()}, function),
+                *metric('rpc_stage_calls_total', 'counter',
+                        'Stages run by RPC calls.',
+                        self.stage_calls, stage),
+                *metric('rpc_stage_seconds_total', 'counter',
+                        'Wall time of stages of RPC calls.',
+                        self.stage_seconds, stage),
+                *metric('rpc_stage_rows_total', 'counter',
+                        'Rows read and written by stages of RPC calls.',
+                        self.stage_rows, (*stage, 'direction')),
+                *metric('rpc_stage_peak_rss_bytes', 'gauge',
+                        'Highest peak resident memory of the process '
+                        'by the end of stages of RPC calls.',
+                        self.stage_peak_rss, stage),
+            ]
+        rss = peak_rss()
+        if rss is not None:
+            lines += ['# HELP process_peak_rss_bytes '
+                      'Peak resident memory of the process.',
+                      '# TYPE process_peak_rss_bytes gauge',
+                      f'process_peak_rss_bytes {rss}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,20 @@
+from contextvars import ContextVar
+from typing import Callable, Optional
+from . import metrics
+
+# callback(stage, done, total) of the job running in this context
+callback: ContextVar[Optional[Callable]] = ContextVar('progress', default=None)
+
+
+def report(stage: str, done: Optional[int] = None,
+           total: Optional[int] = None):
+    """
+    Report progress of the running job, if any,
+    e.g. report('fuzzyfy', names grouped, names),
+    and time `stage` of the RPC call being profiled.
+
+    """
+    metrics.stage(stage)
+    fn = callback.get()
+    if fn is not None:
+        fn(stage, done, total)
@@ -0,0 +1,244 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import OrderedDict
+from typing import Optional
+from rapidfuzz import process
+from .cache import DiskCache, content_hash
+from .common import read_csv
+from .datasets import Dataset
+from .fuzzy import (
+    WEIGHTS,
+    SCORERS,
+    MAX_CELLS,
+    normalize,
+    process_names,
+)
+
+NAME_INDEXES_MAX_BYTES = int(os.environ.get('NAME_INDEXES_MAX_BYTES',
+                                            256 << 20))
+# names of the highest ratios scored in full to bound the kth best score
+SHORTLIST = 4
+
+
+def split_words(names):
+    """
+    Words of names exploded, indexed by their name's position,
+    and whether each name repeats a word.
+
+    """
+    words = pd.Series(names, dtype=object).str.split()
+    repeated = words.map(len) != words.map(lambda w: len(set(w)))
+    return words.explode().dropna(), repeated.to_numpy()
+
+
+def postings(names):
+    """
+    Positions of names by word, as (words, starts, positions) where
+    names of words[i] are positions[starts[i]:starts[i + 1]],
+    along with the positions of names repeating a word.
+
+    """
+    words, repeated = split_words(names)
+    codes, tokens = pd.factorize(words.to_numpy(), sort=True)
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(tokens) + 1))
+    return (pd.Index(tokens), starts, words.index.to_numpy()[order],
+            np.flatnonzero(repeated))
+
+
+class NameIndex:
+    """
+    Distinct corporation names of a contacts file, the number
+    of registrations they appear in and their processed names,
+    to find the most similar ones to a name, scored as by fuzzyfy.
+
+    Names are ordered by Count descending,
+    which breaks ties between equally similar names.
+
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.names = table.column('CorporationName').to_numpy()
+        self.counts = table.column('Count').to_numpy()
+        self.processed = table.column('Processed').to_numpy()
+        self.tokens, self.starts, self.positions, self.repeated = \
+            postings(self.processed)
+        self.ignore_keywords = json.loads(
+            table.schema.metadata[b'ignore_keywords'])
+
+    @classmethod
+    def build(cls, contacts_file, ignore_keywords: Optional[list] = None):
+        df = read_csv(contacts_file,
+                      usecols=['RegistrationID', 'CorporationName'],
+                      dtype={'RegistrationID': 'UInt32',
+                             'CorporationName': 'string'})
+        counts = (df.dropna(subset='CorporationName').drop_duplicates()
+                  ['CorporationName'].value_counts(sort=False))
+        # stable sort by count, then first occurrence
+        counts = counts.sort_values(ascending=False, kind='stable')
+        processed = process_names(counts.index.to_series(), ignore_keywords)
+        table = pa.table({
+            'CorporationName': pa.array(counts.index, pa.string()),
+            'Count': pa.array(counts.to_numpy(), pa.int64()),
+            'Processed': pa.array(processed, pa.string())})
+        return cls(table.replace_schema_metadata({
+            b'ignore_keywords': json.dumps(ignore_keywords or []).encode()}))
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes + self.starts.nbytes + self.positions.nbytes
+
+    def search(self, queries: list[str], limit: int = 10,
+               score_cutoff: float = 0, workers: int = 1):
+        """
+        Atmost `limit` names atleast `score_cutoff` similar
+        to each query, most similar first.
+
+        Returns
+        -------
+        dataframe with Query, CorporationName, Count, Similarity columns.
+
+        """
+        if limit < 1:
+            raise ValueError(f'Limit must be atleast 1, got {limit}')
+        processed = process_names(pd.Series(queries, dtype=object),
+                                  self.ignore_keywords)
+        size = max(MAX_CELLS // max(len(self.processed), 1), 1)
+        matches = [(np.empty(0, int), np.empty(0, int), np.empty(0))]
+        for start in range(0, len(processed), size):
+            rows, cols, scores = self.scores(
+                processed[start:start + size], limit, score_cutoff, workers)
+            # by query, score descending then position
+            order = np.lexsort((cols, -scores, rows))
+            rows, cols, scores = rows[order], cols[order], scores[order]
+            ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+            top = ranks < limit
+            matches.append((rows[top] + start, cols[top], scores[top]))
+
+        rows, cols, scores = map(np.concatenate, zip(*matches))
+        return pd.DataFrame({
+            'Query': pd.array(np.asarray(queries, object)[rows], 'string'),
+            'CorporationName': pd.array(self.names[cols], 'string'),
+            'Count': self.counts[cols],
+            'Similarity': scores})
+
+    def shared(self, queries):
+        """
+        (query positions, name positions), possibly repeated, of names
+        sharing a token with their query, or either repeating a token:
+        the only pairs whose token_set_ratio may differ from their ratio.
+
+        """
+        tokens, starts, positions = self.tokens, self.starts, self.positions
+        words, repeated = split_words(queries)
+        codes = tokens.get_indexer(words.to_numpy())
+        found = codes >= 0
+        rows, codes = words.index.to_numpy()[found], codes[found]
+        counts = starts[codes + 1] - starts[codes]
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        rows = np.concatenate([
+            np.repeat(rows, counts),
+            np.repeat(np.arange(len(queries)), len(self.repeated)),
+            np.repeat(np.flatnonzero(repeated), len(self.processed))])
+        cols = np.concatenate([
+            positions[np.repeat(starts[codes], counts) + offsets],
+            np.tile(self.repeated, len(queries)),
+            np.tile(np.arange(len(self.processed)), repeated.sum())])
+        return rows, cols
+
+    def scores(self, queries, limit, score_cutoff, workers):
+        """
+        Weighted scores of queries and names, pruned by a lower bound
+        of the `limit`th best score of each query: the `limit`th best
+        among the SHORTLIST times `limit` names of the highest ratio.
+        Only names sharing a token with their query are scored in full,
+        others' token_set_ratio being their ratio.
+
+        Returns
+        -------
+        (query positions, name positions, weighted scores)
+        including the `limit` best of each query atleast score_cutoff.
+
+        """
+        weights = normalize(WEIGHTS)
+        (ratio, token_set), (ratio_weight, token_set_weight) = \
+            SCORERS, weights
+
+        def weighted(rows, cols, ratios):
+            return ratios * ratio_weight + process.cpdist(
+                queries[rows], self.processed[cols], scorer=token_set,
+                dtype=np.float64, workers=workers) * token_set_weight
+
+        min_ratio = max(score_cutoff - 100 * token_set_weight, 0) \
+            / ratio_weight
+        ratios = process.cdist(queries, self.processed, scorer=ratio,
+                               score_cutoff=min_ratio, dtype=np.float64,
+                               workers=workers)
+
+        cutoffs = np.full(len(queries), float(score_cutoff))
+        shortlist = limit * SHORTLIST
+        if len(self.processed) > shortlist:
+            cols = np.argpartition(-ratios, shortlist - 1, axis=1)[
+                :, :shortlist].ravel()
+            rows = np.repeat(np.arange(len(queries)), shortlist)
+            full = weighted(rows, cols, ratios[rows, cols])
+            kth = np.sort(full.reshape(-1, shortlist), axis=1)[:, -limit]
+            cutoffs = np.maximum(cutoffs, kth)
+        # scorers round differently near their cutoff
+        cutoffs -= 1e-6
+
+        shared = np.zeros(ratios.shape, bool)
+        shared[self.shared(queries)] = True
+        min_ratios = np.where(
+            shared, ((cutoffs - 100 * token_set_weight) / ratio_weight)
+            [:, None], cutoffs[:, None])
+        rows, cols = np.nonzero(ratios >= np.maximum(min_ratios, 0))
+        scores = weighted(rows, cols, ratios[rows, cols])
+        kept = scores >= cutoffs[rows]
+        return rows[kept], cols[kept], scores[kept]
+
+
+class NameIndexes:
+    """
+    NameIndex of each contacts dataset and set of ignore_keywords,
+    built once and saved as parquet, those used the latest kept in
+    memory while their total size is within `max_bytes`.
+
+    Parameters
+    ----------
+    directory  : created if missing.
+    max_bytes  : total size of indexes kept in memory.
+
+    """
+
+    def __init__(self, directory: str,
+                 max_bytes: int = NAME_INDEXES_MAX_BYTES):
+        self.cache = DiskCache(directory, suffix='.parquet')
+        self.max_bytes = max_bytes
+        self.indexes = OrderedDict()
+
+    def get(self, contacts_file: Dataset,
+            ignore_keywords: Optional[list] = None):
+        keywords = sorted({k.lower() for k in ignore_keywords or ()})
+        key = content_hash(contacts_file.id, keywords)
+        index = self.indexes.pop(key, None)
+        if index is None:
+            index = self.cache.read(
+                key, lambda path: NameIndex(pq.read_table(path)))
+        if index is None:
+            index = NameIndex.build(contacts_file, keywords)
+            self.cache.write(key, lambda file: pq.write_table(
+                index.table, file))
+        self.indexes[key] = index
+
+        total = sum(index.nbytes for index in self.indexes.values())
+        while total > self.max_bytes and len(self.indexes) > 1:
+            _, evicted = self.indexes.popitem(last=False)
+            total -= evicted.nbytes
+        return index
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Optional
+from .cache import DiskCache, content_hash
+from .datasets import PANDAS_DTYPES, conform
+
+# kept apart from CACHE_DIR, which defaults to a temporary directory,
+# since snapshots are kept until deleted, e.g. last month's contacts
+SNAPSHOTS_DIR = os.environ.get('SNAPSHOTS_DIR', os.path.join(
+    os.path.expanduser('~'), '.housing-analytics', 'snapshots'))
+SNAPSHOTS_MAX_BYTES = int(os.environ.get('SNAPSHOTS_MAX_BYTES', 4 << 30))
+# 1 to let clients list and delete all snapshots, e.g. on private servers,
+# otherwise they only use the snapshots they know the name of
+SNAPSHOTS_MANAGED = int(os.environ.get('SNAPSHOTS_MANAGED', 0))
+
+
+def to_table(df):
+    """
+    Arrow table of df, where object columns of strings besides
+    numbers, e.g. joined by dedup, keep their numbers in a second column.
+
+    """
+    mixed = {}
+    for name, col in df.items():
+        if col.dtype != 'object':
+            continue
+        try:
+            pa.array(col, from_pandas=True)
+        except pa.ArrowException:
+            mixed[name] = col
+    df = df.assign(**{
+        name: col.where(col.map(type) == str) for name, col in mixed.items()})
+    table = pa.Table.from_pandas(df, preserve_index=True)
+
+    numbers = {}
+    for name, col in mixed.items():
+        numbers[name] = f'{name}:numbers'
+        table = table.append_column(numbers[name], pa.array(
+            col.where(col.map(type) != str), from_pandas=True))
+    return table.replace_schema_metadata({
+        **table.schema.metadata, b'numbers': json.dumps(numbers).encode()})
+
+
+def to_frame(table):
+    """
+    Inverse of to_table, strings backed by arrow
+    and columns of DTYPES conformed to them.
+
+    """
+    numbers = json.loads(table.schema.metadata.get(b'numbers', b'{}'))
+    values = {name: table.column(column) for name, column in numbers.items()}
+    df = table.drop_columns(list(numbers.values())).to_pandas(
+        types_mapper=PANDAS_DTYPES.get)
+    for name, array in values.items():
+        na = df[name].isna().to_numpy()
+        strings = df[name].to_numpy(object)
+        strings[na] = array.to_pandas(integer_object_nulls=True) \
+            .to_numpy(object)[na]
+        df[name] = strings
+    return conform(df)
+
+
+class Snapshot:
+    """
+    Saved snapshot, read whole or in chunks like a Dataset.
+
+    """
+
+    def __init__(self, path: str):
+        # an open file remains readable once deleted
+        self.file = pq.ParquetFile(path)
+        metadata = self.file.schema_arrow.metadata
+        self.name = metadata[b'name'].decode()
+        self.filename = metadata[b'filename'].decode()
+        self.saved = float(metadata[b'saved'])
+        self.rows = self.file.metadata.num_rows
+
+    def read(self, chunksize: Optional[int] = None):
+        """
+        Saved dataframe, or an iterator of dataframes of `chunksize` rows.
+
+        """
+        if chunksize is None:
+            return to_frame(self.file.read())
+        schema = self.file.schema_arrow
+        return (to_frame(pa.Table.from_batches([batch], schema))
+                for batch in self.file.iter_batches(chunksize))
+
+
+class SnapshotStore:
+    """
+    Prepared contacts saved under a name, e.g. of last month's file,
+    to diff the next file against without parsing and preparing it again.
+    Stored as parquet named by a hash of their name, kept until deleted,
+    never evicted: saves beyond `max_bytes` are refused instead.
+
+    Parameters
+    ----------
+    directory  : created if missing.
+    max_bytes  : total size of snapshots to keep.
+
+    """
+
+    def __init__(self, directory: str = SNAPSHOTS_DIR,
+                 max_bytes: int = SNAPSHOTS_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache = DiskCache(directory, None, '.parquet')
+
+    @staticmethod
+    def key(name: str):
+        if not name or not name.strip():
+            raise ValueError('Snapshot name is required')
+        return content_hash(name.strip())
+
+    def save(self, name: str, df: pd.DataFrame, filename: str = ''):
+        table = to_table(df)
+        table = table.replace_schema_metadata({
+            **table.schema.metadata,
+            b'name': name.strip().encode(),
+            b'filename': filename.encode(),
+            b'saved': str(time.time()).encode()})
+        key = self.key(name)
+        fd, path = tempfile.mkstemp(dir=self.cache.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pq.write_table(table, file)
+            size = os.path.getsize(path)
+            # besides the snapshot it replaces, if any
+            used = sum(stored for _, stored, other, _ in self.cache.files()
+                       if other != key)
+            if used + size > self.max_bytes:
+                raise ValueError(
+                    f'Snapshot {name} of {size} bytes exceeds the '
+                    f'{self.max_bytes - used} bytes left of '
+                    f'{self.max_bytes}, delete older snapshots first')
+            self.cache.move(key, path)
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def get(self, name: str):
+        snapshot = self.cache.read(self.key(name), Snapshot)
+        if snapshot is None:
+            raise ValueError(f'Snapshot {name} not found')
+        return snapshot
+
+    def load(self, name: str):
+        return self.get(name).read()
+
+    def delete(self, name: str):
+        self.cache.remove(self.key(name))
+
+    def list(self, names: Optional[list[str]] = None):
+        """
+        Saved snapshots of `names`, None for all, most recently used first.
+
+        """
+        keys = None if names is None else {self.key(name) for name in names}
+        snapshots = []
+        for last_use, size, key, path in reversed(self.cache.files()):
+            if keys is not None and key not in keys:
+                continue
+            try:
+                snapshot = Snapshot(path)
+            except FileNotFoundError:
+                continue
+            snapshots.append({
+                'name': snapshot.name,
+                'filename': snapshot.filename,
+                'rows': snapshot.rows,
+                'bytes': size,
+                'saved': snapshot.saved,
+                'last_used': last_use,
+            })
+        return snapshots
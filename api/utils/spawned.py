@@ -0,0 +1,197 @@
+import os
+import atexit
+import tempfile
+import traceback
+import multiprocessing
+import pandas as pd
+import pyarrow as pa
+from typing import Callable, Optional
+from .snapshots import to_table, to_frame
+
+
+def compute(path: str, fn: Callable, args: tuple):
+    """
+    Write the dataframe fn(*args) to an Arrow IPC file at `path`.
+
+    Returns
+    -------
+    None, or the error raised instead.
+
+    """
+    try:
+        table = to_table(fn(*args))
+        with pa.OSFile(path, 'wb') as sink, \
+                pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    except Exception as e:
+        print(traceback.format_exc())
+        return e
+
+
+def serve(conn):
+    """
+    Worker process loop: compute the dataframes received on `conn`
+    one at a time, sending back their errors if any.
+
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        error = compute(*message)
+        try:
+            conn.send(error)
+        except Exception:
+            # unpicklable error
+            conn.send(RuntimeError(str(error)))
+
+
+class FrameWorker:
+    """
+    Process computing dataframes sent over a pipe, one at a time.
+    Spawned rather than forked, since the server's gevent hub and
+    monkey patched threads don't survive a fork, hence functions
+    and their arguments must be picklable, like module level functions
+    and Datasets.
+
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, conn = context.Pipe()
+        # sockets of monkey patched socketpair are non-blocking
+        for end in (self.conn, conn):
+            os.set_blocking(end.fileno(), True)
+        self.process = context.Process(
+            target=serve, args=(conn,), daemon=True)
+        self.process.start()
+        conn.close()
+
+    def submit(self, path: str, fn: Callable, args: tuple):
+        self.conn.send((path, fn, args))
+
+    def wait(self):
+        """
+        Wait for the dataframe submitted last.
+
+        Returns
+        -------
+        None, or the error its function raised.
+
+        """
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.process.join()
+            raise RuntimeError(
+                f'Process exited with {self.process.exitcode}') from None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SpawnedFrame:
+    """
+    Dataframe being computed by a FramePool's worker, returned as
+    an Arrow IPC file rather than pickled, which is memory mapped once
+    done, its strings left backed by the mapping instead of copied.
+
+    """
+
+    def __init__(self, pool: 'FramePool', fn: Callable, args: tuple):
+        self.pool = pool
+        self.worker = pool.checkout()
+        fd, self.path = tempfile.mkstemp(dir=pool.directory, suffix='.arrow')
+        os.close(fd)
+        try:
+            self.worker.submit(self.path, fn, args)
+        except BaseException:
+            self.close()
+            raise
+
+    def result(self) -> pd.DataFrame:
+        """
+        Wait for the dataframe, raising the error its function raised if any.
+
+        """
+        try:
+            error = self.worker.wait()
+            self.pool.release(self.worker)
+            self.worker = None
+            if error is not None:
+                raise error
+            with pa.memory_map(self.path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            return to_frame(table)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Kill the worker if its result wasn't waited for,
+        as it may still be computing, and remove the file.
+
+        """
+        if self.worker is not None:
+            self.worker.kill()
+            self.worker = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FramePool:
+    """
+    Compute dataframes in worker processes, e.g. to prepare several
+    files at once. Workers are spawned on demand, as many as dataframes
+    computed at once, and atmost `workers` idle ones are kept for later
+    calls, sparing them the startup and imports of a process.
+
+    Parameters
+    ----------
+    workers    : number of idle processes to keep.
+    directory  : of the IPC files, defaults to the system's temporary one,
+        e.g. /dev/shm to keep them in shared memory.
+
+    """
+
+    def __init__(self, workers: int = 2, directory: Optional[str] = None):
+        self.workers = workers
+        self.directory = directory
+        self.idle = []
+        atexit.register(self.stop)
+
+    def submit(self, fn: Callable, *args):
+        """
+        SpawnedFrame of fn(*args), to be closed unless its result
+        is waited for.
+
+        """
+        return SpawnedFrame(self, fn, args)
+
+    def checkout(self):
+        return self.idle.pop() if self.idle else FrameWorker()
+
+    def release(self, worker: FrameWorker):
+        if len(self.idle) < self.workers:
+            self.idle.append(worker)
+        else:
+            worker.stop()
+
+    def stop(self):
+        for worker in self.idle:
+            worker.stop()
+        self.idle = []
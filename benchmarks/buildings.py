@@ -0,0 +1,76 @@
+"""
+Merging buildings into a synthetic compare_contacts diff on RegistrationID,
+reading the buildings file for each request versus looking them up in
+a BuildingIndex built by the first one:
+    python -m benchmarks.buildings --contacts 1000000 --requests 5
+
+"""
+import io
+import argparse
+from time import perf_counter
+from api.mod import contacts
+from api.utils.buildings import BuildingIndex
+from api.utils.common import read_csv
+from api.utils.diff import diff_frames
+from .diff import DIFF_ARGS
+from .synthetic import registration_contacts, contacts_revision, buildings
+
+COLUMNS = ['BuildingID', 'Zip', 'LegalClassA']
+
+
+def csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def merged(dfc, buildings_file):
+    buildings_file.seek(0)
+    dfbs = read_csv(buildings_file, usecols=COLUMNS + ['RegistrationID'])
+    dfbs.columns = dfbs.columns.map(lambda c: (c, ''))
+    return dfc.merge(dfbs, on='RegistrationID', how='left')
+
+
+def indexed(dfc, index):
+    positions, columns = index.merge(dfc[('RegistrationID', '')], COLUMNS)
+    dfc = dfc.take(positions).reset_index(drop=True)
+    for col, values in columns.items():
+        dfc[(col, '')] = values
+    return dfc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--changed', type=float, default=0.2)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    old = registration_contacts(args.contacts, args.seed)
+    dfc = diff_frames(
+        contacts.prepare(csv(old)),
+        contacts.prepare(
+            csv(contacts_revision(old, args.seed, args.changed)), new=True),
+        **DIFF_ARGS)
+    buildings_file = csv(buildings(
+        args.contacts // 3, args.seed, registrations=args.contacts // 4))
+    print(f'diff: {len(dfc)} rows')
+
+    start = perf_counter()
+    for _ in range(args.requests):
+        expected = merged(dfc, buildings_file)
+    merge_time = perf_counter() - start
+
+    start = perf_counter()
+    index = None
+    for _ in range(args.requests):
+        index = index or BuildingIndex(buildings_file)
+        result = indexed(dfc, index)
+    time = perf_counter() - start
+
+    assert expected.equals(result), 'index differs from merge'
+    print(f'{args.requests} requests, merge: {merge_time:.2f}s, '
+          f'index: {time:.2f}s ({merge_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+contacts.prepare with lowercasing and diff keys by python per value
+and string concatenation versus Arrow and hashing, on synthetic contacts
+about the size of the full Registration Contacts file, or the file itself:
+    python -m benchmarks.contacts --contacts 800000
+    python -m benchmarks.contacts --file RegistrationContact.csv
+
+"""
+import io
+import argparse
+from unittest import mock
+import pandas as pd
+from api.mod import contacts
+from api.utils import common
+from .fuzzy import timed
+from .synthetic import registration_contacts
+
+INDEX = [
+    'RegistrationContactID',
+    'RegistrationID',
+    'FirstName',
+    'MiddleInitial',
+    'LastName',
+]
+
+
+def python_lowercase(df):
+    def lower(col):
+        if col.dtype == 'string':
+            return col.str.lower()
+        elif col.dtype == 'object':
+            return col.map(
+                lambda s:
+                    s.lower() if isinstance(s, str) else s, na_action='ignore')
+        return col
+    return df.apply(lower)
+
+
+def concat_cols(df):
+    df = df.astype('string').fillna('')
+    cols = df.columns
+    combined = df[cols[0]]
+    for col in cols[1:]:
+        combined += df[col]
+    return combined
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=800_000)
+    parser.add_argument('--file', help='Registration Contacts CSV file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'rb') as file:
+            data = file.read()
+    else:
+        data = registration_contacts(args.contacts, args.seed).to_csv(
+            index=False).encode()
+    df = pd.read_csv(io.BytesIO(data), dtype={
+        'RegistrationContactID': 'UInt32',
+        'RegistrationID': 'UInt32'})
+    print(f'contacts: {len(df)} rows, {len(data) / 2**20:.0f}MB')
+
+    lowered, python_time = timed(python_lowercase, df)
+    result, time = timed(common.lowercase, df)
+    assert lowered.equals(result), 'lowercase differs'
+    print(f'lowercase: python {python_time:.2f}s, '
+          f'arrow {time:.2f}s ({python_time / time:.1f}x)')
+
+    keys, concat_time = timed(concat_cols, lowered[INDEX])
+    hashes, time = timed(common.hash_cols, lowered[INDEX])
+    # the same rows share a key
+    assert (pd.factorize(keys)[0] == pd.factorize(hashes)[0]).all(), \
+        'hashes group rows unlike concatenation'
+    print(f'keys: concatenated {concat_time:.2f}s, '
+          f'hashed {time:.2f}s ({concat_time / time:.1f}x)')
+
+    with mock.patch.object(contacts, 'lowercase', python_lowercase), \
+            mock.patch.object(contacts, 'hash_cols', concat_cols):
+        before, before_time = timed(
+            contacts.prepare, io.BytesIO(data), INDEX)
+    after, time = timed(contacts.prepare, io.BytesIO(data), INDEX)
+    assert before.reset_index(drop=True).equals(
+        after.reset_index(drop=True)), 'prepared contacts differ'
+    print(f'prepare: before {before_time:.2f}s, '
+          f'after {time:.2f}s ({before_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
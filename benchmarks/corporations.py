@@ -0,0 +1,67 @@
+"""
+corporations.prepare peak memory and time on synthetic contacts and buildings,
+reading each file whole versus in chunks:
+    python -m benchmarks.corporations --contacts 2000000 --buildings 400000
+
+"""
+import os
+import argparse
+import tempfile
+import tracemalloc
+from api.mod import corporations
+from .fuzzy import timed
+from .synthetic import registration_contacts, buildings
+
+
+def traced(fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs), its time and peak memory allocated by python and numpy.
+
+    """
+    tracemalloc.start()
+    try:
+        result, time = timed(fn, *args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=2_000_000)
+    parser.add_argument('--buildings', type=int, default=400_000)
+    parser.add_argument('--chunksize', type=int,
+                        default=corporations.CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    registrations = max(args.contacts // 4, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        contacts_file = os.path.join(directory, 'contacts.csv')
+        buildings_file = os.path.join(directory, 'buildings.csv')
+        registration_contacts(
+            args.contacts, args.seed, registrations).to_csv(
+            contacts_file, index=False)
+        buildings(
+            args.buildings, args.seed, registrations).to_csv(
+            buildings_file, index=False)
+        for file in (contacts_file, buildings_file):
+            size = os.path.getsize(file) / 2**20
+            print(f'{os.path.basename(file)}: {size:.0f}MB')
+
+        results = {}
+        for mode, chunksize in (('whole', None), ('chunked', args.chunksize)):
+            results[mode] = traced(
+                corporations.prepare, contacts_file, buildings_file,
+                ['LegalClassA', 'LegalClassB'], ['street', 'condominium'],
+                chunksize=chunksize)
+
+    whole, *_ = results['whole']
+    for mode, (result, time, peak) in results.items():
+        assert whole.equals(result), f'{mode} differs from whole'
+        print(f'{mode}: {time:.2f}s, peak {peak / 2**20:.0f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+dedup of synthetic contacts whose RegistrationContactIDs repeat,
+by groupby aggregation with a python function versus joining
+distinct sorted values of each group at once:
+    python -m benchmarks.dedup --contacts 100000 --ids 25000
+
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from api.utils.common import dedup, lowercase
+from .fuzzy import timed
+from .synthetic import registration_contacts
+
+INDEX = ['RegistrationContactID', 'RegistrationID']
+
+
+def groupby_dedup(df, index):
+    duplicated = df.duplicated(subset=index, keep=False)
+    dupes = df[duplicated]
+    if dupes.empty:
+        return df
+    nodupes = dupes.groupby(index, dropna=False).agg(
+        lambda x: ' | '.join(
+            x.dropna().astype(str).str.lower().drop_duplicates().sort_values()
+        )).reset_index()
+    return pd.concat([df[~duplicated], nodupes])
+
+
+def duplicate_contacts(n, ids, seed=0):
+    """
+    registration_contacts whose `n` rows share `ids` contact
+    and registration ID pairs, hence nearly all rows are duplicates.
+
+    """
+    rng = np.random.default_rng(seed)
+    df = registration_contacts(n, seed)
+    pairs = rng.integers(0, ids, n)
+    df['RegistrationContactID'] = pd.array(pairs + 1, 'UInt32')
+    df['RegistrationID'] = pd.array(pairs % (ids // 4 + 1) + 100000, 'UInt32')
+    return lowercase(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=100_000)
+    parser.add_argument('--ids', type=int, default=25_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = duplicate_contacts(args.contacts, args.ids, args.seed)
+    duplicated = df.duplicated(subset=INDEX, keep=False).sum()
+    print(f'contacts: {len(df)} rows, {duplicated} duplicates')
+
+    expected, groupby_time = timed(groupby_dedup, df, INDEX)
+    result, time = timed(dedup, df, INDEX)
+    assert expected.equals(result), 'dedup differs from groupby'
+    print(f'groupby: {groupby_time:.2f}s, '
+          f'dedup: {time:.2f}s ({groupby_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
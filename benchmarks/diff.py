@@ -0,0 +1,79 @@
+"""
+compare_contacts diff peak memory and time on synthetic contacts and
+their revision, preparing and comparing whole files versus partitioned
+into buckets of at most `--bucket-rows` rows:
+    python -m benchmarks.diff --contacts 1000000 --bucket-rows 250000
+
+Peak memory is as traced by python and numpy, excluding Arrow buffers
+of parquet reads and writes.
+
+"""
+import os
+import argparse
+import tempfile
+from api.mod import contacts
+from api.utils.diff import diff_frames
+from api.utils.common import condo_coop_mask
+from .corporations import traced
+from .synthetic import registration_contacts, contacts_revision
+
+DIFF_ARGS = dict(
+    ignore_cols=(*contacts.INDEX,),
+    show_atleast=(*contacts.INDEX, 'BusinessZip'),
+    removed_mask=condo_coop_mask)
+
+
+def whole(old_file, new_file):
+    return diff_frames(
+        contacts.prepare(old_file),
+        contacts.prepare(new_file, new=True),
+        **DIFF_ARGS)
+
+
+def partitioned(old_file, new_file, buckets, workers=1):
+    return contacts.diff_chunks(
+        contacts.clean_chunks(old_file),
+        contacts.clean_chunks(new_file, new=True),
+        buckets, workers=workers, **DIFF_ARGS)
+
+
+def rows(df):
+    return df.reset_index().pipe(
+        lambda df: df.sort_values(list(df.columns)).reset_index(drop=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--changed', type=float, default=0.1)
+    parser.add_argument('--bucket-rows', type=int, nargs='+',
+                        default=[500_000, 250_000, 100_000])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        old_file = os.path.join(directory, 'old.csv')
+        new_file = os.path.join(directory, 'new.csv')
+        old = registration_contacts(args.contacts, args.seed)
+        contacts_revision(old, args.seed, args.changed).to_csv(
+            new_file, index=False)
+        old.to_csv(old_file, index=False)
+        del old
+
+        expected, time, peak = traced(whole, old_file, new_file)
+        print(f'whole: {len(expected)} differences, {time:.2f}s, '
+              f'peak {peak / 2**20:.0f}MB')
+        expected = rows(expected)
+        for bucket_rows in args.bucket_rows:
+            buckets = -(-args.contacts // bucket_rows)
+            result, time, peak = traced(
+                partitioned, old_file, new_file, buckets, args.workers)
+            assert expected.equals(rows(result)), \
+                f'{buckets} buckets differ from whole'
+            print(f'{buckets} buckets: {time:.2f}s, '
+                  f'peak {peak / 2**20:.0f}MB')
+
+
+if __name__ == '__main__':
+    main()
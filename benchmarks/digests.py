@@ -0,0 +1,44 @@
+"""
+diff_frames of prepared synthetic contacts and their revision with few
+changes, comparing all rows in both versus only those whose digests differ:
+    python -m benchmarks.digests --contacts 1000000 --changed 0.01
+
+"""
+import io
+import argparse
+from api.mod import contacts
+from api.utils.diff import diff_frames
+from .diff import DIFF_ARGS
+from .fuzzy import timed
+from .synthetic import registration_contacts, contacts_revision
+
+
+def csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--changed', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    old = registration_contacts(args.contacts, args.seed)
+    new = contacts_revision(old, args.seed, args.changed)
+    odf = contacts.prepare(csv(old))
+    ndf = contacts.prepare(csv(new), new=True)
+    del old, new
+
+    expected, compare_time = timed(
+        diff_frames, odf, ndf, digests=False, **DIFF_ARGS)
+    result, time = timed(diff_frames, odf, ndf, **DIFF_ARGS)
+    assert expected.equals(result), 'digests differ from comparing all rows'
+    changed = (result['ChangeType'] == 'changed').sum()
+    print(f'{len(odf)} old, {len(ndf)} new rows, {changed} changed')
+    print(f'compare all: {compare_time:.2f}s, '
+          f'digests: {time:.2f}s ({compare_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+compare_contacts Excel export through openpyxl versus write_excel,
+on the diff of synthetic contacts and their next month's revision:
+    python -m benchmarks.excel --contacts 550000 --changed 0.3
+
+The diff of the defaults is about 100k rows.
+
+"""
+import io
+import argparse
+import openpyxl
+from api.mod import contacts
+from api.utils.diff import diff_frames
+from api.utils.buildings import BuildingIndex
+from api.utils.common import condo_coop_mask, write_excel
+from .fuzzy import timed
+from .synthetic import registration_contacts, contacts_revision, buildings
+
+INDEX = [
+    'RegistrationContactID',
+    'RegistrationID',
+    'FirstName',
+    'MiddleInitial',
+    'LastName',
+]
+
+
+def csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def compare_frame(n, seed=0, changed=0.1):
+    """
+    compare_contacts export frame of n synthetic contacts
+    and their revision.
+
+    """
+    old = registration_contacts(n, seed)
+    new = contacts_revision(old, seed, changed)
+    contacts_old = contacts.prepare(csv(old), INDEX)
+    contacts_new = contacts.prepare(csv(new), INDEX, new=True)
+    old_rids = contacts_old['RegistrationID'].copy()
+    dfc = diff_frames(
+        contacts_old,
+        contacts_new,
+        ignore_cols=(*INDEX,),
+        show_atleast=(*INDEX, 'BusinessZip'),
+        removed_mask=condo_coop_mask)
+
+    dfbs = BuildingIndex(csv(buildings(n // 3, seed, registrations=n // 4)))
+    dfc = contacts.post_process(
+        dfc, dfbs, ['BuildingID', 'Zip', 'LegalClassA'], old_rids=old_rids,
+        col_order={'first': ('ChangeType', *INDEX),
+                   'last': ('BusinessZip', 'Zip', 'ZipMatch')})
+    return dfc.set_index('ChangeType')
+
+
+def cells(buffer):
+    sheet = openpyxl.load_workbook(buffer).active
+    return sorted(map(str, sheet.merged_cells.ranges)), [
+        [(c.value, c.font.b, c.border.left.style, c.alignment.horizontal)
+         for c in row] for row in sheet.iter_rows()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=550_000)
+    parser.add_argument('--changed', type=float, default=0.3)
+    parser.add_argument('--verify', type=int, default=2_000,
+                        help='rows to compare cell by cell')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dfc = compare_frame(args.contacts, args.seed, args.changed)
+    print(f'diff: {len(dfc)} rows x {len(dfc.columns)} columns')
+
+    sample = dfc.head(args.verify)
+    buffers = io.BytesIO(), io.BytesIO()
+    sample.to_excel(buffers[0], engine='openpyxl')
+    write_excel(sample, buffers[1])
+    assert cells(buffers[0]) == cells(buffers[1]), 'cells differ'
+
+    _, openpyxl_time = timed(
+        dfc.to_excel, io.BytesIO(), engine='openpyxl')
+    print(f'openpyxl: {openpyxl_time:.2f}s')
+    _, time = timed(write_excel, dfc, io.BytesIO())
+    print(f'write_excel: {time:.2f}s ({openpyxl_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+fuzzyfy scoring modes on synthetic corporation names:
+per name full scan, batched cdist with and without blocking by length
+and repeated runs on cache: the first one grouped as batched,
+the second one searching the neighbors cached for later ones.
+
+Per name scoring is quadratic with python overhead on every pair,
+hence it's timed on the first `--baseline` names only:
+    python -m benchmarks.fuzzy --names 200000 --baseline 20000
+
+"""
+import argparse
+import tempfile
+from time import perf_counter
+from api.utils.cache import DiskCache
+from api.utils.fuzzy import fuzzyfy
+from .synthetic import corporation_counts
+
+IGNORE_KEYWORDS = ['property', 'management', 'services',
+                   'corporation', 'corp', 'inc', 'real estate']
+
+
+def timed(fn, *args, **kwargs):
+    start = perf_counter()
+    result = fn(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=200_000)
+    parser.add_argument('--baseline', type=int, default=20_000)
+    parser.add_argument('--similarity', type=float, default=90)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = corporation_counts(args.names, args.seed)
+    sample = df.head(args.baseline)
+    cache = DiskCache(tempfile.mkdtemp(), suffix='.npz')
+
+    modes = {
+        'full scan': dict(batch_size=0),
+        'unblocked': dict(workers=args.workers, blocking=False),
+        'batched': dict(workers=args.workers),
+        'cached first run': dict(workers=args.workers, cache=cache),
+        'cached second run': dict(workers=args.workers, cache=cache),
+        'cached later run': dict(workers=args.workers, cache=cache),
+    }
+    results = {}
+    for mode, kwargs in modes.items():
+        results[mode] = timed(fuzzyfy, sample, args.similarity,
+                              IGNORE_KEYWORDS, **kwargs)
+
+    full, full_time = results['full scan']
+    for mode, (result, time) in results.items():
+        assert full.equals(result), f'{mode} groups differ from full scan'
+        print(f'{len(sample)} names: {mode} {time:.2f}s '
+              f'({full_time / time:.1f}x)')
+
+    _, unblocked_time = timed(fuzzyfy, df, args.similarity, IGNORE_KEYWORDS,
+                              workers=args.workers, blocking=False)
+    print(f'{len(df)} names: unblocked {unblocked_time:.2f}s')
+    _, time = timed(fuzzyfy, df, args.similarity, IGNORE_KEYWORDS,
+                    workers=args.workers)
+    print(f'{len(df)} names: batched {time:.2f}s '
+          f'({unblocked_time / time:.1f}x)')
+    for run in ('first', 'second', 'later'):
+        _, time = timed(fuzzyfy, df, args.similarity, IGNORE_KEYWORDS,
+                        workers=args.workers, cache=cache)
+        print(f'{len(df)} names: cached {run} run {time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
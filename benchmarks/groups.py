@@ -0,0 +1,56 @@
+"""
+Incremental corporation_count on a synthetic next month's names,
+a few percent of them new, versus grouping them all again by fuzzyfy,
+along with the drift of the incremental groups from fuzzyfy's:
+    python -m benchmarks.groups --names 100000 --new 0.03
+
+"""
+import argparse
+import tempfile
+import numpy as np
+from api.utils.groups import GroupStore, incremental_fuzzyfy
+from .fuzzy import timed, IGNORE_KEYWORDS
+from .synthetic import corporation_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=100_000)
+    parser.add_argument('--new', type=float, default=0.03)
+    parser.add_argument('--similarity', type=float, default=90)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = corporation_counts(args.names, args.seed)
+    rng = np.random.default_rng(args.seed)
+    new = rng.random(len(df)) < args.new
+    # names gone by next month, as many as the new ones
+    gone = rng.random(len(df)) < args.new
+    month = df[~new].reset_index(drop=True)
+    next_month = df[~gone].reset_index(drop=True)
+
+    store = GroupStore(tempfile.mkdtemp())
+    _, time = timed(incremental_fuzzyfy, month, store, 'contacts',
+                    args.similarity, IGNORE_KEYWORDS, workers=args.workers)
+    print(f'{len(month)} names: first run {time:.2f}s')
+
+    result, time = timed(incremental_fuzzyfy, next_month, store,
+                         'contacts', args.similarity, IGNORE_KEYWORDS,
+                         workers=args.workers)
+    print(f'{len(next_month)} names, {new.sum()} new: '
+          f'incremental run {time:.2f}s')
+    changed = result['FuzzyChange'].dropna()
+    print(f'{(changed != "").sum()} of {len(changed)} groups changed')
+
+    result, rebuild_time = timed(incremental_fuzzyfy, next_month, store,
+                                 'contacts', args.similarity, IGNORE_KEYWORDS,
+                                 rebuild=True, workers=args.workers)
+    fuzzy_names = result[result.columns[0]].ffill()
+    drift = (fuzzy_names != result['IncrementalFuzzyName']).sum()
+    print(f'rebuild {rebuild_time:.2f}s ({rebuild_time / time:.1f}x), '
+          f'{drift} names grouped differently by the incremental run')
+
+
+if __name__ == '__main__':
+    main()
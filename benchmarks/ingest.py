@@ -0,0 +1,67 @@
+"""
+Parsing synthetic Registration Contacts and Buildings CSVs with pandas' C
+parser inferring undeclared dtypes, as readers did, versus pyarrow with
+datasets.DTYPES and arrow strings, whole and projected to the columns
+corporations.prepare reads, along with their size in memory:
+    python -m benchmarks.ingest --contacts 1000000
+
+"""
+import os
+import argparse
+import tempfile
+import pandas as pd
+from api.utils.common import read_csv
+from api.utils.datasets import DTYPES, conform, convert
+from .fuzzy import timed
+from .synthetic import registration_contacts, buildings
+
+IDS = {col: DTYPES[col] for col in (
+    'RegistrationContactID', 'RegistrationID', 'BuildingID')}
+PROJECTED = {
+    'contacts': ['RegistrationID', 'CorporationName', 'ContactDescription'],
+    'buildings': ['RegistrationID', 'LegalClassA', 'LegalClassB'],
+}
+
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    registrations = max(args.contacts // 4, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        files = {name: os.path.join(directory, f'{name}.csv')
+                 for name in PROJECTED}
+        registration_contacts(args.contacts, args.seed, registrations) \
+            .to_csv(files['contacts'], index=False)
+        buildings(max(args.contacts // 3, 1), args.seed, registrations) \
+            .to_csv(files['buildings'], index=False)
+
+        for name, path in files.items():
+            print(f'{name}: {os.path.getsize(path) / 2**20:.0f}MB')
+            for usecols in (None, PROJECTED[name]):
+                dtype = {col: t for col, t in IDS.items()
+                         if col in (usecols or DTYPES)}
+                expected, c_time = timed(
+                    pd.read_csv, path, usecols=usecols, dtype=dtype)
+                result, time = timed(read_csv, path, usecols=usecols)
+                assert conform(expected[result.columns]).equals(result), \
+                    f'{name} differs from the C parser'
+                print(f'  {"projected" if usecols else "whole"}: '
+                      f'C {c_time:.2f}s {megabytes(expected):.0f}MB, '
+                      f'pyarrow {time:.2f}s {megabytes(result):.0f}MB '
+                      f'({c_time / time:.1f}x)')
+
+            with open(path, 'rb') as file:
+                _, time = timed(convert, file, os.path.join(
+                    directory, f'{name}.parquet'), name)
+            print(f'  converted to parquet in {time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Latency percentiles of concurrent mixed requests against a running server,
+e.g. with RPC calls run in the server process and offloaded to workers:
+    RPC_WORKERS=0 python main.py
+    RPC_WORKERS=4 python main.py
+    python -m benchmarks.load --url http://localhost:8000 \\
+        --clients 16 --heavy 4 --seconds 30
+
+`--clients` light clients load the page, poll metrics and list datasets
+in turn, while `--heavy` clients each upload synthetic contacts
+of `--contacts` rows to corporation_count over and over.
+Refused requests (503) are counted apart from errors.
+
+"""
+import time
+import argparse
+import threading
+import numpy as np
+from uuid import uuid4
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from collections import defaultdict
+from .synthetic import registration_contacts
+
+
+def multipart(fields: dict, files: dict):
+    """
+    multipart/form-data body of fields and files of {name: (filename, bytes)},
+    along with its content type.
+
+    """
+    boundary = uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; '
+                     f'name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; '
+                     f'name="{name}"; filename="{filename}"\r\n'
+                     'Content-Type: text/csv\r\n\r\n'.encode())
+        parts.append(content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def requests(url: str, contacts: bytes):
+    """
+    Requests by kind, as (method, url, body, content type).
+
+    """
+    def rpc(function, files=None, **fields):
+        body, content_type = multipart(
+            {'function': function, **fields}, files or {})
+        return 'POST', f'{url}/process', body, content_type
+
+    return {
+        'page': ('GET', f'{url}/', None, None),
+        'metrics': ('GET', f'{url}/metrics', None, None),
+        'list_datasets': rpc('list_datasets'),
+        'corporation_count': rpc(
+            'corporation_count', {'registration': ('contacts.csv', contacts)},
+            similarity=90, **{'ignore-keywords': 'corp,inc,llc'}),
+    }
+
+
+def client(kinds, requests, deadline, latencies, lock):
+    i = 0
+    while time.perf_counter() < deadline:
+        kind = kinds[i % len(kinds)]
+        method, url, body, content_type = requests[kind]
+        headers = {'Content-Type': content_type} if content_type else {}
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(url, body, headers, method=method)) as r:
+                r.read()
+            outcome = 'ok'
+        except HTTPError as e:
+            outcome = 'refused' if e.code == 503 else 'error'
+        except OSError:
+            outcome = 'error'
+        with lock:
+            latencies[kind, outcome].append(time.perf_counter() - start)
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--heavy', type=int, default=4)
+    parser.add_argument('--contacts', type=int, default=50_000)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    contacts = registration_contacts(args.contacts, args.seed) \
+        .to_csv(index=False).encode()
+    reqs = requests(args.url.rstrip('/'), contacts)
+    latencies = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    clients = [['page', 'metrics', 'list_datasets']] * args.clients + \
+        [['corporation_count']] * args.heavy
+    threads = [threading.Thread(
+        target=client, args=(kinds, reqs, deadline, latencies, lock))
+        for kinds in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f'{args.clients} light and {args.heavy} heavy clients '
+          f'for {args.seconds:.0f}s, {len(contacts) >> 20}MB uploads')
+    for (kind, outcome), seconds in sorted(latencies.items()):
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+        print(f'{kind:>17} {outcome:>7}: {len(seconds):5} requests, '
+              f'p50 {p50:7.1f}ms p95 {p95:7.1f}ms p99 {p99:7.1f}ms '
+              f'max {max(seconds) * 1000:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Processing corporation names of synthetic contacts for fuzzyfy,
+applying a python processor to each name versus process_names,
+first and once the names are memoized:
+    python -m benchmarks.names --contacts 1000000
+
+"""
+import re
+import argparse
+from api.utils.fuzzy import process_names
+from .fuzzy import timed, IGNORE_KEYWORDS
+from .synthetic import registration_contacts
+
+
+def python_processor(ignore_keywords=None):
+    ignore_regex = r'(?![\-.&])\W'
+    if ignore_keywords:
+        ignore_keywords = sorted(ignore_keywords, key=len, reverse=True)
+        ignore_keywords = '|'.join(ignore_keywords).lower()
+        ignore_regex = f'{ignore_keywords}|{ignore_regex}'
+    ignore_regex = re.compile(ignore_regex)
+
+    def process(s: str):
+        processed = ignore_regex.sub(' ', s.lower())
+        processed = ' '.join(sorted(processed.split()))
+        return processed if processed else '#'
+
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = registration_contacts(args.contacts, args.seed)[
+        'CorporationName'].dropna()
+    print(f'{len(names)} names, {names.nunique()} distinct')
+
+    expected, python_time = timed(
+        names.apply, python_processor(IGNORE_KEYWORDS))
+    for run in ('first', 'memoized'):
+        result, time = timed(process_names, names, IGNORE_KEYWORDS)
+        assert (expected.to_numpy() == result).all(), \
+            'process_names differs from python processor'
+        print(f'python: {python_time:.2f}s, process_names {run}: '
+              f'{time:.2f}s ({python_time / time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+compare_contacts' inputs prepared one after the other versus at once:
+old and new contacts by FramePool workers while buildings are indexed
+in this process, after a first warm up call spawning the workers:
+    python -m benchmarks.prepare --contacts 400000 --repeat 3
+
+"""
+import argparse
+import tempfile
+from time import perf_counter
+from api.mod import contacts
+from api.utils.buildings import BuildingIndex
+from api.utils.datasets import DatasetStore
+from api.utils.spawned import FramePool
+from .buildings import COLUMNS
+from .suite import write_csvs
+
+
+def sequential(old, new, buildings):
+    old = contacts.prepare(old)
+    new = contacts.prepare(new, new=True)
+    BuildingIndex(buildings).load(COLUMNS)
+    return old, new
+
+
+def parallel(pool, old, new, buildings):
+    frames = [pool.submit(contacts.prepare, new, contacts.INDEX, True),
+              pool.submit(contacts.prepare, old)]
+    try:
+        BuildingIndex(buildings).load(COLUMNS)
+        new, old = [frame.result() for frame in frames]
+    finally:
+        for frame in frames:
+            frame.close()
+    return old, new
+
+
+def best(fn, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn(*args)
+        times.append(perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--contacts', type=int, default=400_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files = write_csvs(args.contacts, tempfile.mkdtemp(), args.seed)
+    store = DatasetStore(tempfile.mkdtemp())
+    old, new, buildings = (store.register(open(files[name], 'rb')) for name in
+                           ('contacts-old', 'contacts-new', 'buildings'))
+
+    expected, sequential_time = best(
+        sequential, old, new, buildings, repeat=args.repeat)
+    pool = FramePool(2)
+    _, warm_up = best(parallel, pool, old, new, buildings, repeat=1)
+    result, parallel_time = best(
+        parallel, pool, old, new, buildings, repeat=args.repeat)
+    pool.stop()
+
+    identical = all(a.equals(b) for a, b in zip(expected, result))
+    print(f'{args.contacts} contacts: sequential {sequential_time:.2f}s, '
+          f'parallel {parallel_time:.2f}s '
+          f'({sequential_time / parallel_time:.1f}x), first call spawning '
+          f'workers {warm_up:.2f}s, identical: {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Top-k similar corporation names of synthetic queries by NameIndex
+versus scoring every name with weighted_cdist:
+    python -m benchmarks.search --names 150000 --queries 100 --limit 10
+
+"""
+import io
+import argparse
+import numpy as np
+import pandas as pd
+from api.utils.fuzzy import WEIGHTS, SCORERS, process_names, weighted_cdist
+from api.utils.search import NameIndex
+from .fuzzy import timed, IGNORE_KEYWORDS
+from .synthetic import corporation_names
+
+
+def scan(index, queries, limit, score_cutoff):
+    scores = weighted_cdist(
+        process_names(pd.Series(queries, dtype=object), IGNORE_KEYWORDS),
+        index.processed, score_cutoff, WEIGHTS, SCORERS)
+    top = []
+    for query, row in zip(queries, scores):
+        order = np.lexsort((np.arange(len(row)), -row))
+        order = order[row[order] >= max(score_cutoff, 1e-9)][:limit]
+        top += [(query, index.names[i], row[i]) for i in order]
+    return top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=150_000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--similarity', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = corporation_names(args.names, args.seed)
+    contacts = pd.DataFrame({'RegistrationID': np.arange(len(names)),
+                             'CorporationName': names})
+    index, time = timed(NameIndex.build, io.BytesIO(
+        contacts.to_csv(index=False).encode()), IGNORE_KEYWORDS)
+    print(f'{len(index.names)} names indexed in {time:.2f}s')
+
+    rng = np.random.default_rng(args.seed)
+    # half of them indexed names, half of them new
+    queries = [*rng.choice(index.names, args.queries // 2),
+               *corporation_names(args.queries - args.queries // 2,
+                                  args.seed + 1)]
+    expected, scan_time = timed(
+        scan, index, queries, args.limit, args.similarity)
+    result, time = timed(index.search, queries, args.limit, args.similarity)
+    assert expected == list(result[['Query', 'CorporationName', 'Similarity']]
+                            .itertuples(index=False, name=None)), \
+        'index differs from scanning all names'
+    print(f'{len(queries)} queries, scan: {scan_time:.2f}s, index: '
+          f'{time:.2f}s ({scan_time / time:.1f}x), '
+          f'{time / len(queries) * 1000:.1f}ms per query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Time each stage of corporation_count and compare_contacts on synthetic
+Registration Contacts and Buildings CSVs at several scales, saving the
+results to compare later runs, e.g. after upgrading pandas or rapidfuzz,
+against them:
+    python -m benchmarks.suite --scales small medium
+    python -m benchmarks.suite --scales small medium --compare \\
+        benchmarks/results/<previous run>.json
+
+Each stage is timed on its own, the best of `--repeat` runs, with
+the previous stages' results as input. Stages slower than the compared
+run by more than `--tolerance` are reported as regressions, exiting 1.
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow
+import rapidfuzz
+from api.mod import contacts, corporations
+from api.utils.buildings import BuildingIndex
+from api.utils.common import bufferize, ExportType
+from api.utils.diff import diff_frames
+from api.utils.fuzzy import fuzzyfy
+from .diff import DIFF_ARGS
+from .fuzzy import timed, IGNORE_KEYWORDS
+from .synthetic import registration_contacts, contacts_revision, buildings
+
+# contacts of each scale, with a third as many buildings
+SCALES = {'small': 10_000, 'medium': 100_000, 'large': 1_000_000}
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+BUILDING_COLS = ['LegalClassA', 'LegalClassB']
+FILTER_KEYWORDS = ['street', 'avenue']
+COL_ORDER = {'first': ('ChangeType', *contacts.INDEX),
+             'last': ('BusinessZip', 'Zip', 'ZipMatch')}
+
+
+def write_csvs(n, directory, seed=0, changed=0.1):
+    """
+    Old and new contacts and buildings CSVs of `n` contacts in `directory`.
+
+    """
+    old = registration_contacts(n, seed)
+    files = {name: os.path.join(directory, f'{name}.csv')
+             for name in ('contacts-old', 'contacts-new', 'buildings')}
+    contacts_revision(old, seed, changed).to_csv(
+        files['contacts-new'], index=False)
+    old.to_csv(files['contacts-old'], index=False)
+    buildings(max(n // 3, 1), seed, registrations=max(n // 4, 1)).to_csv(
+        files['buildings'], index=False)
+    return files
+
+
+def best(repeat, fn, *args, **kwargs):
+    results = [timed(fn, *args, **kwargs) for _ in range(repeat)]
+    return results[0][0], min(time for _, time in results)
+
+
+def stages(files, similarity, repeat):
+    """
+    Seconds and output rows of each stage.
+
+    """
+    results = {}
+
+    def run(stage, fn, *args, **kwargs):
+        result, seconds = best(repeat, fn, *args, **kwargs)
+        rows = len(result) if isinstance(result, pd.DataFrame) else None
+        results[stage] = {'seconds': seconds, 'rows': rows}
+        print(f'  {stage}: {seconds:.3f}s' +
+              (f', {rows} rows' if rows is not None else ''))
+        return result
+
+    df = run('corporations.prepare', corporations.prepare,
+             files['contacts-old'], files['buildings'],
+             BUILDING_COLS, FILTER_KEYWORDS)
+    run('fuzzyfy', fuzzyfy, df, similarity, IGNORE_KEYWORDS)
+
+    odf = run('contacts.prepare old', contacts.prepare, files['contacts-old'])
+    ndf = run('contacts.prepare new', contacts.prepare,
+              files['contacts-new'], new=True)
+    dfc = run('diff_frames', diff_frames, odf, ndf, **DIFF_ARGS)
+
+    old_rids = odf['RegistrationID'].copy()
+    index = run('BuildingIndex', BuildingIndex, files['buildings'])
+    # post_process modifies the diff in place
+    dfc = run('post_process', lambda: contacts.post_process(
+        dfc.copy(), index, ['BuildingID', 'Zip', *BUILDING_COLS],
+        old_rids, COL_ORDER))
+
+    dfc = dfc.set_index('ChangeType')
+    run('bufferize excel', bufferize, dfc, ExportType.EXCEL)
+    run('bufferize csv', bufferize, dfc, ExportType.CSV)
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+        'rapidfuzz': rapidfuzz.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print stage times relative to `baseline`, returning
+    the stages slower by more than `tolerance`.
+
+    """
+    regressions = []
+    for scale, stages in results.items():
+        for stage, result in stages.items():
+            before = baseline.get(scale, {}).get(stage)
+            if before is None:
+                continue
+            ratio = result['seconds'] / max(before['seconds'], 1e-9)
+            regressed = ratio > tolerance
+            if regressed:
+                regressions.append((scale, stage))
+            print(f'{scale} {stage}: {before["seconds"]:.3f}s -> '
+                  f'{result["seconds"]:.3f}s ({ratio:.2f}x)' +
+                  (' REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'],
+                        help=f'of {", ".join(SCALES)} or numbers of contacts')
+    parser.add_argument('--similarity', type=float, default=90)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results JSON, by default '
+                        'benchmarks/results/<timestamp>.json')
+    parser.add_argument('--compare', help='results JSON of a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = {}
+    for scale in args.scales:
+        n = SCALES[scale] if scale in SCALES else int(scale)
+        print(f'{scale}: {n} contacts')
+        with tempfile.TemporaryDirectory() as directory:
+            files = write_csvs(n, directory, args.seed)
+            results[scale] = stages(files, args.similarity, args.repeat)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({'environment': environment(), 'args': vars(args),
+                   'results': results}, file, indent=2)
+    print(f'saved {output}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f'compared to {args.compare}: {baseline["environment"]}')
+        if compare(results, baseline['results'], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
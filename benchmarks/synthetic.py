@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+ONSETS = ('b', 'br', 'c', 'ch', 'd', 'f', 'g', 'gr', 'h', 'j', 'k', 'l',
+          'm', 'n', 'p', 'r', 's', 'sh', 'st', 't', 'th', 'v', 'w', 'z')
+NUCLEI = ('a', 'e', 'i', 'o', 'u', 'ou', 'ea', 'y')
+CODAS = ('', '', 'n', 'r', 'l', 's', 't', 'ck', 'nd', 'rt', 'm', 'x')
+SYLLABLES = tuple(o + n + c for o in ONSETS for n in NUCLEI for c in CODAS)
+
+SUFFIXES = (
+    'llc', 'l.l.c.', 'corp', 'corporation', 'inc', 'inc.', 'co', 'associates',
+    'realty', 'management', 'property management', 'group', 'ltd', 'services',
+    'real estate', 'partners', 'holdings', 'housing development fund',
+)
+
+
+def words(rng, n):
+    lengths = rng.integers(1, 4, n)
+    picks = rng.integers(0, len(SYLLABLES), lengths.sum())
+    splits = np.cumsum(lengths)[:-1]
+    return [''.join(SYLLABLES[i] for i in w) for w in np.split(picks, splits)]
+
+
+def typo(rng, name):
+    i = int(rng.integers(0, len(name)))
+    kind = rng.integers(0, 4)
+    char = chr(ord('a') + int(rng.integers(0, 26)))
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + char + name[i:]
+    if kind == 2:
+        return name[:i] + char + name[i + 1:]
+    return name[:i] + name[i + 1:i + 2] + name[i:i + 1] + name[i + 2:]
+
+
+def corporation_names(n, seed=0, typo_rate=0.3):
+    """
+    Distinct corporation names resembling NYC registration contacts:
+    one to three made up words followed by an optional entity suffix,
+    with about `typo_rate` of them being misspelled variants of others.
+
+    """
+    rng = np.random.default_rng(seed)
+    vocab = words(rng, max(n // 2, 16))
+    # ordered, unlike a set of strings whose order varies with hash seeds
+    names = {}
+    bases = []
+    while len(names) < n:
+        if bases and rng.random() < typo_rate:
+            name = bases[int(rng.integers(0, len(bases)))]
+            for _ in range(int(rng.integers(1, 3))):
+                name = typo(rng, name)
+        else:
+            picks = rng.integers(0, len(vocab), rng.integers(1, 4))
+            name = ' '.join(vocab[i] for i in picks)
+            if rng.random() < 0.8:
+                name += ' ' + SUFFIXES[int(rng.integers(0, len(SUFFIXES)))]
+            bases.append(name)
+        names[name.upper()] = None
+    return list(names)
+
+
+def corporation_counts(n, seed=0, building_cols=('LegalClassA',)):
+    """
+    corporations.prepare shaped output:
+    CorporationName, Count, *building_cols sorted by Count descending.
+
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'CorporationName': pd.array(corporation_names(n, seed), 'string'),
+        'Count': rng.zipf(2.2, n).clip(max=500),
+    })
+    for col in building_cols:
+        df[col] = df['Count'] * rng.integers(0, 40, n)
+    return df.sort_values('Count', ascending=False, kind='stable') \
+        .reset_index(drop=True)
+
+
+CONTACT_TYPES = ('CorporateOwner', 'HeadOfficer', 'Agent', 'SiteManager',
+                 'IndividualOwner', 'Officer', 'Shareholder', 'JointOwner')
+CONTACT_DESCRIPTIONS = ('CONDO', 'CO-OP', 'Corporation', 'LLC', 'Other', '')
+CITIES = ('NEW YORK', 'BROOKLYN', 'BRONX', 'STATEN ISLAND', 'LONG ISLAND CITY',
+          'ASTORIA', 'FLUSHING', 'JAMAICA', 'GREAT NECK', 'JERSEY CITY')
+STATES = ('NY', 'NY', 'NY', 'NY', 'NJ', 'CT', 'FL')
+STREET_SUFFIXES = ('STREET', 'AVENUE', 'PLACE', 'ROAD', 'BOULEVARD')
+
+
+def pick(rng, values, n, p=None):
+    return np.asarray(values, object)[rng.choice(len(values), n, p=p)]
+
+
+def with_nulls(rng, values, rate):
+    values = values.copy()
+    values[rng.random(len(values)) < rate] = None
+    return values
+
+
+def street_names(rng, n):
+    return np.char.add(
+        np.char.upper(np.array(words(rng, n), str)),
+        np.char.add(' ', pick(rng, STREET_SUFFIXES, n).astype(str)))
+
+
+def zips(rng, n):
+    return np.char.zfill(rng.integers(10001, 11698, n).astype(str), 5)
+
+
+def registration_contacts(n, seed=0, registrations=None):
+    """
+    Registration Contacts shaped dataframe of `n` contacts spread
+    across `registrations` (defaults to n / 4) RegistrationIDs,
+    about a third of them condo/co-op corporations whose names repeat
+    in a zipfian fashion.
+
+    """
+    rng = np.random.default_rng(seed)
+    registrations = registrations or max(n // 4, 1)
+    corporations = np.array(corporation_names(max(n // 8, 1), seed), object)
+    ranks = rng.zipf(1.6, n) % len(corporations)
+    descriptions = pick(rng, CONTACT_DESCRIPTIONS, n,
+                        p=(0.2, 0.15, 0.2, 0.15, 0.1, 0.2))
+    first_names = np.char.upper(np.array(words(rng, 500), str))
+    last_names = np.char.upper(np.array(words(rng, 2000), str))
+    streets = street_names(rng, 1000)
+
+    return pd.DataFrame({
+        'RegistrationContactID': rng.permutation(n) + 1,
+        'RegistrationID': rng.integers(100000, 100000 + registrations, n),
+        'Type': pick(rng, CONTACT_TYPES, n),
+        'ContactDescription': np.where(descriptions == '', None, descriptions),
+        'CorporationName': with_nulls(rng, corporations[ranks], 0.4),
+        'Title': with_nulls(rng, pick(rng, ('President', 'Member',
+                                            'Officer', 'Agent'), n), 0.5),
+        'FirstName': with_nulls(rng, pick(rng, first_names, n), 0.3),
+        'MiddleInitial': with_nulls(
+            rng, pick(rng, tuple('ABCDEFGHJKLMNPRSTW'), n), 0.7),
+        'LastName': with_nulls(rng, pick(rng, last_names, n), 0.3),
+        'BusinessHouseNumber': rng.integers(1, 3000, n).astype(str),
+        'BusinessStreetName': pick(rng, streets, n),
+        'BusinessApartment': with_nulls(
+            rng, rng.integers(1, 40, n).astype(str).astype(object), 0.6),
+        'BusinessCity': pick(rng, CITIES, n),
+        'BusinessState': pick(rng, STATES, n),
+        'BusinessZip': zips(rng, n),
+    })
+
+
+def buildings(n, seed=0, registrations=None):
+    """
+    Buildings Subject to HPD Jurisdiction shaped dataframe of `n` buildings,
+    each registered under one of `registrations` (defaults to n)
+    RegistrationIDs, matching those of registration_contacts.
+
+    """
+    rng = np.random.default_rng(seed)
+    registrations = registrations or n
+    low = rng.integers(1, 3000, n)
+    high = low + rng.integers(0, 3, n) * 2
+    stories = rng.integers(1, 40, n)
+    return pd.DataFrame({
+        'BuildingID': rng.permutation(n) + 1,
+        'BoroID': rng.integers(1, 6, n),
+        'HouseNumber': low.astype(str),
+        'LowHouseNumber': low.astype(str),
+        'HighHouseNumber': high.astype(str),
+        'StreetName': pick(rng, street_names(rng, 5000), n),
+        'Zip': zips(rng, n),
+        'Block': rng.integers(1, 16000, n),
+        'Lot': rng.integers(1, 9000, n),
+        'LegalStories': stories,
+        'LegalClassA': stories * rng.integers(0, 12, n),
+        'LegalClassB': rng.integers(0, 4, n) * (rng.random(n) < 0.1),
+        'RegistrationID': rng.integers(100000, 100000 + registrations, n),
+    })
+
+
+def contacts_revision(contacts, seed=0, changed=0.1, removed=0.02, added=0.02):
+    """
+    Next month's registration_contacts: `changed` of the contacts
+    moved their business address, `removed` of them are gone
+    and `added` new ones registered.
+
+    """
+    rng = np.random.default_rng(seed)
+    revised = contacts.copy()
+    moved = rng.random(len(revised)) < changed
+    n = int(moved.sum())
+    revised.loc[moved, 'BusinessHouseNumber'] = \
+        rng.integers(1, 3000, n).astype(str)
+    revised.loc[moved, 'BusinessStreetName'] = \
+        pick(rng, street_names(rng, 1000), n)
+    revised.loc[moved, 'BusinessZip'] = zips(rng, n)
+
+    new = registration_contacts(
+        max(int(len(contacts) * added), 1), seed + 1,
+        registrations=max(len(contacts) // 4, 1))
+    new['RegistrationContactID'] += contacts['RegistrationContactID'].max()
+    kept = rng.random(len(revised)) >= removed
+    return pd.concat([revised[kept], new], ignore_index=True)
@@ -0,0 +1,41 @@
+"""
+fuzzyfy at several similarities in a single pass, sharing the neighbors
+searched at the lowest one, versus a separate fuzzyfy at each:
+    python -m benchmarks.thresholds --names 50000 --similarities 85 90 95
+
+"""
+import argparse
+from api.utils.fuzzy import fuzzyfy, fuzzyfy_thresholds
+from .fuzzy import timed, IGNORE_KEYWORDS
+from .synthetic import corporation_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--names', type=int, default=50_000)
+    parser.add_argument('--similarities', type=float, nargs='+',
+                        default=[85, 90, 95])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = corporation_counts(args.names, args.seed)
+    separate = 0
+    results = {}
+    for similarity in args.similarities:
+        results[similarity], time = timed(
+            fuzzyfy, df, similarity, IGNORE_KEYWORDS, workers=args.workers)
+        separate += time
+        print(f'fuzzyfy at {similarity:g}: {time:.2f}s, '
+              f'{results[similarity].iloc[:, 0].notna().sum()} groups')
+
+    shared, time = timed(fuzzyfy_thresholds, df, args.similarities,
+                         IGNORE_KEYWORDS, workers=args.workers)
+    identical = all(shared[s].equals(results[s]) for s in results)
+    print(f'{len(df)} names, {args.workers} workers: separate runs '
+          f'{separate:.2f}s, single pass {time:.2f}s '
+          f'({separate / time:.1f}x), identical groups: {identical}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,79 @@
+import os
 import traceback
 from gevent import monkey
 from gevent.pywsgi import WSGIServer
 from flask_compress import Compress
-from flask import Flask, request, abort, render_template
-from api.process import RPC
-monkey.patch_all()
+from flask import Flask, Response, abort, render_template, jsonify
+from werkzeug.exceptions import HTTPException
+from api.process import metrics
+from api.offload import Offload
+from api.jobs import JobQueue
+from api.utils.cache import CACHE_DIR
 
 
-app = Flask('HousingAnalytics')
+def create_app(offload: Offload, jobs: JobQueue):
+    app = Flask('HousingAnalytics')
 
-compress = Compress()
-compress.init_app(app)
+    compress = Compress()
+    compress.init_app(app)
 
+    @app.route('/')
+    def main_page():
+        return render_template('main.html')
 
-@app.route('/')
-def main_page():
-    return render_template('main.html')
+    @app.route('/process', methods=['POST'])
+    def process():
+        try:
+            return offload.process()
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(traceback.format_exc())
+            abort(400,
+                  f'{str(e)}\nRefresh page process same file(s) again! 🥠')
 
+    @app.route('/metrics')
+    def metrics_page():
+        return Response(metrics.prometheus(),
+                        mimetype='text/plain; version=0.0.4')
 
-@app.route('/process', methods=['POST'])
-def process():
-    function = request.form.get('function')
-    try:
-        return RPC.get(function)()
-    except Exception as e:
-        print(traceback.format_exc())
-        abort(400, f'{str(e)}\nRefresh page process same file(s) again! 🥠')
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        try:
+            job = jobs.submit()
+        except Exception as e:
+            print(traceback.format_exc())
+            abort(400, str(e))
+        return jsonify(job.to_dict()), 202
+
+    @app.route('/jobs/<id>')
+    def job_status(id):
+        job = jobs.get(id)
+        if job is None:
+            abort(404, f'Job {id} not found')
+        return jsonify(job.to_dict())
+
+    @app.route('/jobs/<id>/result')
+    def job_result(id):
+        result = jobs.result(id)
+        if result is None:
+            abort(404, f'Result of job {id} is not available')
+        return result
+
+    return app
 
 
 HOST = '0.0.0.0'
 PORT = 8000
-http_server = WSGIServer((HOST, PORT), app)
-print(f'Listening at http://{HOST}:{PORT} 🚀')
-http_server.serve_forever()
+
+# spawned worker processes import this module as __mp_main__,
+# hence they neither patch nor build a server of their own
+if __name__ == '__main__':
+    monkey.patch_all()
+    offload = Offload(os.path.join(CACHE_DIR, 'offload'))
+    jobs = JobQueue(offload, os.path.join(CACHE_DIR, 'jobs'))
+    app = create_app(offload, jobs)
+    offload.start()
+    http_server = WSGIServer((HOST, PORT), app)
+    print(f'Listening at http://{HOST}:{PORT} 🚀')
+    http_server.serve_forever()
@@ -17,3 +17,59 @@ addEventListener(
   },
   true,
 );
+
+// run forms in background as jobs, polling their progress
+const describe = (job) => {
+  const progress = job.total ? ` ${job.done}/${job.total}` : '';
+  return `${job.status} ${job.stage ?? ''}${progress}`;
+};
+
+document.querySelectorAll('form').forEach((form) => {
+  form.addEventListener('submit', async (event) => {
+    if (!form.background?.checked) return;
+    event.preventDefault();
+    const status = form.querySelector('.job-status');
+    const response = await fetch('/jobs', {
+      method: 'POST',
+      body: new FormData(form),
+    });
+    if (!response.ok) {
+      status.innerHTML = await response.text();
+      return;
+    }
+    let job = await response.json();
+    while (job.status === 'queued' || job.status === 'running') {
+      status.innerText = describe(job);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      job = await (await fetch(`/jobs/${job.id}`)).json();
+    }
+    if (job.status === 'finished') {
+      status.innerText = 'finished';
+      window.location = `/jobs/${job.id}/result`;
+    } else {
+      status.innerText = `failed: ${job.error}`;
+    }
+  });
+});
+
+// list datasets uploaded from this browser, remembering their IDs
+const datasets = document.getElementById('datasets');
+datasets['dataset-ids'].value = localStorage.getItem('dataset-ids') ?? '';
+datasets.addEventListener('submit', async (event) => {
+  event.preventDefault();
+  const list = datasets.querySelector('.dataset-list');
+  const response = await fetch('/process', {
+    method: 'POST',
+    body: new FormData(datasets),
+  });
+  list.hidden = false;
+  if (!response.ok) {
+    list.innerHTML = await response.text();
+    return;
+  }
+  const listed = await response.json();
+  const ids = listed.map((dataset) => dataset.id).join(',');
+  localStorage.setItem('dataset-ids', ids);
+  datasets['dataset-ids'].value = ids;
+  list.innerText = JSON.stringify(listed, null, 2);
+});